@@ -1,10 +1,35 @@
 import streamlit as st
 import uuid
 import os
-from utils.file_utils import extract_text_from_file, save_uploaded_file
-from utils.privacy import anonymize_text, cleanup_temp_files, ensure_nltk_data
-from utils.embeddings import load_embedding_model
-from utils.evaluator import evaluate_synopsis
+from utils.file_utils import extract_text_from_buffer, extract_text_from_file, save_uploaded_file
+from utils.privacy import anonymize_text, ensure_nltk_data
+from utils.scoring_client import get_scoring_service_url, score_remote
+from utils import tracing, warmup
+from utils.result_cache import content_hash, get_session_result_cache, scoring_config_key
+from utils import session_state
+# torch/transformers (utils.embeddings, utils.evaluator) are imported on first use
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Expose Prometheus metrics once per server process when SYNOPSIS_METRICS_PORT is set"""
+    port = os.environ.get("SYNOPSIS_METRICS_PORT")
+    if not port:
+        return None
+    tracing.enable_tracing()
+    return tracing.start_metrics_server(int(port))
+
+@st.cache_resource
+def start_session_sweeper():
+    """Expire idle sessions and sweep orphaned upload temp files once per server process"""
+    store = session_state.get_session_store()
+    tracing.register_gauges(lambda: {
+        'synopsis_sessions_live': ('Sessions held in memory', len(store.sessions)),
+        'synopsis_sessions_bytes': ('Estimated bytes held by all sessions', store.bytes_held),
+        'synopsis_sessions_budget_bytes': ('Session memory budget', store.max_bytes),
+        'synopsis_sessions_evicted': ('Sessions evicted to stay under the budget', store.evictions),
+        'synopsis_sessions_expired': ('Sessions dropped after idling', store.expirations),
+    })
+    return session_state.start_session_sweeper(store)
 
 # Simple access control (optional bonus)
 def check_password():
@@ -34,30 +59,50 @@ def check_password():
         # Password correct
         return True
 
+def extract_upload(uploaded_file):
+    """Extract text from an upload in memory, or via a temporary file if SYNOPSIS_UPLOAD_TEMPFILE is set"""
+    if not os.environ.get("SYNOPSIS_UPLOAD_TEMPFILE"):
+        return extract_text_from_buffer(uploaded_file, uploaded_file.name)
+    
+    # Save uploaded file to temporary location
+    temp_path = save_uploaded_file(uploaded_file)
+    
+    # Tie it to this session for cleanup
+    session_state.register_temp_file(temp_path)
+    
+    return extract_text_from_file(temp_path)
+
+def purge_session_data():
+    """
+    Forget every cached text and result held for this session. Shared caches only
+    lose the entries this session added; other sessions keep theirs. Sessions that
+    idle out or are evicted are purged the same way by the session store.
+    """
+    session_state.clear_session_state()
+
 # Function to securely process and clean up data
 def secure_process(func):
     def wrapper(*args, **kwargs):
         # Generate a session ID to track this processing
         session_id = str(uuid.uuid4())
-        temp_files = []
         
         try:
             # Store session info
             st.session_state['current_session'] = session_id
-            st.session_state['temp_files'] = temp_files
             
             # Execute the wrapped function
-            result = func(*args, **kwargs)
-            
-            # Clean up temporary files
-            cleanup_temp_files(temp_files)
+            with tracing.span("request"):
+                result = func(*args, **kwargs)
             
             return result
         
         except Exception as e:
-            # Ensure cleanup even if an error occurs
-            cleanup_temp_files(temp_files)
             st.error(f"An error occurred: {str(e)}")
+        
+        finally:
+            # Clean up temporary files, even if an error occurred, and re-measure the session
+            session_state.release_temp_files()
+            session_state.account_session_state()
             
     return wrapper
 
@@ -65,6 +110,13 @@ def secure_process(func):
 def run_app():
     # Load NLTK data
     ensure_nltk_data()
+    start_metrics_endpoint()
+    start_session_sweeper()
+    
+    # Load the model in the background while the page stays interactive
+    if not get_scoring_service_url():
+        warmup.start_background_warmup()
+        warmup.render_status()
     
     # Check password if enabled
     if not check_password():
@@ -76,15 +128,20 @@ def run_app():
     Upload both files to receive a score and feedback.
     """)
     
-    # Add privacy notice
+    # Add privacy notice; uploads only touch disk when the temp-file fallback is enabled
+    if os.environ.get("SYNOPSIS_UPLOAD_TEMPFILE"):
+        upload_handling = ("Uploaded files are written to a private temporary file for text extraction "
+                           "and deleted as soon as the run finishes.")
+    else:
+        upload_handling = "Uploaded files are processed in memory and never written to disk."
     with st.expander("⚠️ Privacy Information"):
-        st.markdown("""
+        st.markdown(f"""
         **Privacy Protection Strategy:**
         
         1. **Local Processing**: This app uses open-source models running in your browser to evaluate content.
         2. **Data Anonymization**: Names, dates, emails, and other identifiers are replaced with placeholders.
-        3. **No Data Storage**: Uploaded files and processed text are deleted after scoring is complete.
-        4. **Secure Handling**: All file processing happens in isolated temporary storage.
+        3. **No Data Storage**: Uploaded files and processed text are deleted after scoring is complete. Results are kept only in this session's memory (for up to 15 minutes) so the page can redraw quickly, and are dropped when you remove your files or click "Clear my data".
+        4. **Secure Handling**: {upload_handling}
         
         No data is sent to external APIs or stored permanently.
         """)
@@ -98,33 +155,79 @@ def run_app():
     with col2:
         synopsis_file = st.file_uploader("Upload Synopsis (.txt)", type=["txt"])
     
+    # Results are memoized per session by content hash, so reruns with unchanged files are instant
+    if st.sidebar.button("🗑️ Clear my data"):
+        purge_session_data()
+    result_cache = get_session_result_cache()
+    
+    # Sentence-level scoring shows which parts of the article the synopsis covers
+    scoring_mode = "chunks"
+    if not get_scoring_service_url() and st.sidebar.checkbox("Show coverage by article section"):
+        scoring_mode = "sentence_matrix"
+    
+    # Clear-cut submissions can be scored lexically without waiting for the model
+    quick_screening = not get_scoring_service_url() and st.sidebar.checkbox(
+        "Quick screening", help="Skip the language model when a cheap lexical check already gives a clear result")
+    
     # Process files when both are uploaded
     if article_file and synopsis_file:
-        with st.spinner("Reading files..."):
-            # Save uploaded files to temporary location
-            article_temp = save_uploaded_file(article_file)
-            synopsis_temp = save_uploaded_file(synopsis_file)
-            
-            # Add to temp files list for cleanup
-            st.session_state['temp_files'].extend([article_temp, synopsis_temp])
-            
+        article_hash = content_hash(article_file.getbuffer())
+        synopsis_hash = content_hash(synopsis_file.getbuffer())
+        # The PDF text cache is keyed by the same digest; remember it so it is purged with the session
+        uploads = session_state.get_session_state(upload_hashes=set())
+        uploads.upload_hashes.update((article_hash, synopsis_hash))
+        
+        with st.spinner("Reading files..."), tracing.span("upload", article_file.size + synopsis_file.size):
             # Extract text
-            article_text = extract_text_from_file(article_temp)
-            synopsis_text = extract_text_from_file(synopsis_temp)
+            article_text = result_cache.get_or_compute(('extract', article_hash), lambda: extract_upload(article_file))
+            synopsis_text = result_cache.get_or_compute(('extract', synopsis_hash), lambda: extract_upload(synopsis_file))
         
         if article_text and synopsis_text:
             # Anonymize texts for privacy
             st.info("Anonymizing content for privacy protection...")
-            anonymized_article = anonymize_text(article_text)
-            anonymized_synopsis = anonymize_text(synopsis_text)
+            anonymized_article = result_cache.get_or_compute(('anonymize', article_hash),
+                                                             lambda: anonymize_text(article_text))
+            anonymized_synopsis = result_cache.get_or_compute(('anonymize', synopsis_hash),
+                                                              lambda: anonymize_text(synopsis_text))
             
-            # Load model for embeddings
-            with st.spinner("Loading language model..."):
-                tokenizer, model = load_embedding_model()
-            
-            # Evaluate synopsis
-            with st.spinner("Evaluating synopsis quality..."):
-                evaluation = evaluate_synopsis(anonymized_article, anonymized_synopsis, tokenizer, model)
+            evaluation_key = ('evaluate', article_hash, synopsis_hash, scoring_config_key(), scoring_mode, quick_screening)
+            evaluation = result_cache.get(evaluation_key)
+            service_url = get_scoring_service_url()
+            if evaluation is not None:
+                pass  # Unchanged files: reuse the previous evaluation
+            elif service_url:
+                # Score on the shared scoring service instead of loading the model here
+                with st.spinner("Evaluating synopsis quality..."), tracing.span("remote_score"):
+                    evaluation = score_remote(anonymized_article, anonymized_synopsis, service_url)
+            else:
+                from utils.document import ParsedDocument
+                from utils.incremental import get_session_incremental_scorer
+                article_doc = ParsedDocument(anonymized_article)
+                synopsis_doc = ParsedDocument(anonymized_synopsis)
+                
+                def score_with_model():
+                    # Wait for the background model load if it hasn't finished yet
+                    with st.spinner("Loading language model..."):
+                        tokenizer, model = warmup.get_model()
+                    
+                    # Evaluate synopsis, reusing the article index and unchanged sentences from the last version;
+                    # embeddings this adds to the shared cache are tracked so only they are purged with the session
+                    from utils.embedding_cache import get_embedding_cache
+                    state = session_state.get_session_state(embedding_keys=set())
+                    with st.spinner("Evaluating synopsis quality..."), get_embedding_cache().recording(state.embedding_keys):
+                        scorer = get_session_incremental_scorer((article_hash, scoring_config_key()),
+                                                                article_doc, tokenizer, model)
+                        return scorer.score(synopsis_doc, scoring_mode=scoring_mode)
+                
+                if quick_screening:
+                    from utils.cascade import LexicalIndex, evaluate_synopsis_cascade
+                    lexical_index = result_cache.get_or_compute(('lexical_index', article_hash),
+                                                                lambda: LexicalIndex.build(article_doc))
+                    evaluation = evaluate_synopsis_cascade(article_doc, synopsis_doc, score_with_model,
+                                                           lexical_index=lexical_index)
+                else:
+                    evaluation = score_with_model()
+            result_cache.put(evaluation_key, evaluation)
             
             # Display results
             st.subheader("Evaluation Results")
@@ -138,6 +241,8 @@ def run_app():
                     <p style="font-size:1.5rem; margin-top:0;">out of 100</p>
                 </div>
                 """, unsafe_allow_html=True)
+                if evaluation.get('tier') == 'lexical':
+                    st.caption("Scored by quick lexical screening; untick Quick screening for a full evaluation.")
             
             # Display detailed scores (bonus feature)
             with col2:
@@ -151,6 +256,11 @@ def run_app():
                     st.progress(score / 100)
             
             # Display feedback
+            if 'chunk_coverage' in evaluation:
+                st.subheader("Coverage by Article Section")
+                st.caption("Best similarity between any synopsis sentence and each section of the article (covered above 0.5).")
+                st.bar_chart({'coverage': evaluation['chunk_coverage']})
+            
             st.subheader("Qualitative Feedback")
             for feedback in evaluation['feedback']:
                 st.markdown(f"- {feedback}")
@@ -160,4 +270,12 @@ def run_app():
             
             # Add privacy confirmation
             st.success("✅ Processing complete. All uploaded files and processed text will be deleted.")
+    elif not article_file and not synopsis_file:
+        # Uploads were removed: drop everything derived from them
+        purge_session_data()
+    
+    if tracing.is_enabled():
+        tracing.render_sidebar_panel()
+        with st.sidebar.expander("🧠 Session Memory"):
+            st.table([session_state.get_session_store().stats()])
             
@@ -0,0 +1,347 @@
+"""
+Headless batch scoring for large cohorts of submissions.
+
+Usage examples:
+    python batch_score.py --manifest submissions.csv --output scores.jsonl
+    python batch_score.py --input-dir submissions/ --output scores.csv --workers 8
+    python batch_score.py --manifest submissions.csv --output scores.jsonl --dedupe
+
+A manifest is a CSV (or JSONL) file with the columns `id`, `article` and
+`synopsis`, where `article` and `synopsis` are file paths. With --input-dir,
+pairs are matched by name: `<id>_article.txt|pdf` and `<id>_synopsis.txt`.
+
+Successfully scored ids are appended to a checkpoint file so an interrupted job
+can be restarted with the same command and will skip work that is already done.
+Failed pairs are written with an `error` but not checkpointed, so rerunning the
+command retries them; a later row for an id supersedes an earlier error row.
+
+With --cascade, a cheap lexical tier scores clear-cut submissions and the
+embedding model is loaded and run only for the uncertain ones; each result
+records the 'tier' that produced it.
+
+With --dedupe, the synopsis embeddings and MinHash signatures produced while
+scoring are kept, and clusters of suspected near-duplicates are written to
+`<output>.duplicates.json`. Only pairs skipped from the checkpoint are read again.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+from utils.file_utils import extract_text_from_file
+from utils.privacy import anonymize_text, ensure_nltk_data
+
+RESULT_FIELDS = ['id', 'final_score', 'content_coverage', 'coherence', 'clarity', 'length_ratio', 'feedback', 'tier',
+                 'error']
+
+# Per-process model handle, populated once by _init_worker (or on first use with --cascade)
+_worker_model = None
+
+# Uncertain score band when cascade scoring is enabled, else None
+_worker_cascade_band = None
+
+# Whether workers also return each synopsis's embedding and MinHash signature for --dedupe
+_worker_dedupe = False
+
+# Per-process LexicalIndex reuse for cascade scoring
+_lexical_indexes = {}
+
+# Per-process ArticleIndex reuse: a cohort usually shares one article
+_article_indexes = {}
+MAX_ARTICLE_INDEXES = 8
+
+def read_manifest(manifest_path):
+    """Read (id, article_path, synopsis_path) tuples from a CSV or JSONL manifest"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    
+    def resolve(path):
+        return path if os.path.isabs(path) else os.path.join(base_dir, path)
+    
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        if manifest_path.lower().endswith('.jsonl'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            yield str(row['id']), resolve(row['article']), resolve(row['synopsis'])
+
+def scan_directory(input_dir):
+    """Match `<id>_article.*` and `<id>_synopsis.txt` files in a directory"""
+    articles = {}
+    synopses = {}
+    for name in sorted(os.listdir(input_dir)):
+        stem, ext = os.path.splitext(name)
+        path = os.path.join(input_dir, name)
+        if stem.endswith('_article') and ext.lower() in ('.txt', '.pdf'):
+            articles[stem[:-len('_article')]] = path
+        elif stem.endswith('_synopsis') and ext.lower() == '.txt':
+            synopses[stem[:-len('_synopsis')]] = path
+    
+    for pair_id in sorted(set(articles) & set(synopses)):
+        yield pair_id, articles[pair_id], synopses[pair_id]
+
+def load_checkpoint(checkpoint_path):
+    """Return the set of ids already completed by a previous run"""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+def _init_worker(cascade_band=None, dedupe=False):
+    """Load NLTK data and the embedding model once per worker process (lazily when cascading)"""
+    global _worker_cascade_band, _worker_dedupe
+    ensure_nltk_data()
+    _worker_cascade_band = cascade_band
+    _worker_dedupe = dedupe
+    if cascade_band is None:
+        _get_worker_model()
+
+def _get_worker_model():
+    global _worker_model
+    if _worker_model is None:
+        from utils.embeddings import load_embedding_model
+        _worker_model = load_embedding_model()
+    return _worker_model
+
+def _get_lexical_index(article_path):
+    """Build (or reuse) the LexicalIndex for an article file"""
+    from utils.cascade import LexicalIndex
+    key = (os.path.abspath(article_path), os.path.getmtime(article_path))
+    if key not in _lexical_indexes:
+        article_text = anonymize_text(extract_text_from_file(article_path))
+        if not article_text:
+            return None
+        if len(_lexical_indexes) >= MAX_ARTICLE_INDEXES:
+            _lexical_indexes.pop(next(iter(_lexical_indexes)))
+        _lexical_indexes[key] = LexicalIndex.build(article_text)
+    return _lexical_indexes[key]
+
+def _get_article_index(article_path, tokenizer, model):
+    """Build (or reuse) the ArticleIndex for an article file"""
+    from utils.article_index import ArticleIndex
+    key = (os.path.abspath(article_path), os.path.getmtime(article_path))
+    if key not in _article_indexes:
+        article_text = anonymize_text(extract_text_from_file(article_path))
+        if not article_text:
+            return None
+        if len(_article_indexes) >= MAX_ARTICLE_INDEXES:
+            _article_indexes.pop(next(iter(_article_indexes)))
+        _article_indexes[key] = ArticleIndex.build(article_text, tokenizer, model)
+    return _article_indexes[key]
+
+def _duplicate_features(synopsis_text, embedding=None):
+    """Embedding and MinHash signature of an anonymized synopsis, for detect_duplicates"""
+    from utils.duplicates import minhash_signatures
+    from utils.embeddings import get_embeddings
+    if embedding is None:
+        embedding = get_embeddings(synopsis_text, *_get_worker_model())
+    # As numpy, so results cross the pool by plain pickling
+    return embedding.numpy(), minhash_signatures([synopsis_text])[0]
+
+def score_pair(task):
+    """
+    Extract, anonymize and evaluate a single article/synopsis pair.
+    With --dedupe the result also carries '_duplicate_features', which run_batch
+    collects instead of writing.
+    """
+    from utils.embeddings import get_embeddings
+    from utils.evaluator import evaluate_synopsis_with_index
+    pair_id, article_path, synopsis_path = task
+    try:
+        synopsis_text = anonymize_text(extract_text_from_file(synopsis_path))
+        synopsis_embedding = None
+        
+        def score_with_model():
+            nonlocal synopsis_embedding
+            tokenizer, model = _get_worker_model()
+            article_index = _get_article_index(article_path, tokenizer, model)
+            if article_index is None:
+                return None
+            # Embedded once, for scoring and duplicate detection alike
+            synopsis_embedding = get_embeddings(synopsis_text, tokenizer, model)
+            return evaluate_synopsis_with_index(article_index, synopsis_text, tokenizer, model,
+                                                synopsis_embedding=synopsis_embedding)
+        
+        if not synopsis_text:
+            return {'id': pair_id, 'error': 'empty article or synopsis'}
+        if _worker_cascade_band is not None:
+            from utils.cascade import evaluate_synopsis_cascade
+            lexical_index = _get_lexical_index(article_path)
+            if lexical_index is None:
+                return {'id': pair_id, 'error': 'empty article or synopsis'}
+            evaluation = evaluate_synopsis_cascade(None, synopsis_text, score_with_model,
+                                                   uncertain_band=_worker_cascade_band, lexical_index=lexical_index)
+        else:
+            evaluation = score_with_model()
+            if evaluation is None:
+                return {'id': pair_id, 'error': 'empty article or synopsis'}
+        
+        result = {'id': pair_id, 'final_score': evaluation['final_score']}
+        result.update(evaluation['detailed_scores'])
+        result['feedback'] = evaluation['feedback']
+        result['tier'] = evaluation.get('tier', 'model')
+        if _worker_dedupe:
+            result['_duplicate_features'] = _duplicate_features(synopsis_text, synopsis_embedding)
+        return result
+    except Exception as e:
+        return {'id': pair_id, 'error': str(e)}
+
+class ResultWriter:
+    """Append results to a JSONL or CSV file, flushing after every row"""
+    
+    def __init__(self, output_path):
+        self.is_csv = output_path.lower().endswith('.csv')
+        write_header = self.is_csv and (not os.path.exists(output_path) or os.path.getsize(output_path) == 0)
+        self.file = open(output_path, 'a', encoding='utf-8', newline='')
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+            if write_header:
+                self.writer.writeheader()
+    
+    def write(self, result):
+        if self.is_csv:
+            row = dict(result)
+            row['feedback'] = ' | '.join(row.get('feedback', []))
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(result) + '\n')
+        self.file.flush()
+    
+    def close(self):
+        self.file.close()
+
+def run_batch(tasks, output_path, checkpoint_path, workers=None, chunksize=4, cascade_band=None,
+              duplicate_features=None):
+    """
+    Score every task not yet in the checkpoint, streaming results to disk.
+    Only successes are checkpointed, so failed pairs are retried by the next run.
+    cascade_band enables cascade scoring with that uncertain score band.
+    duplicate_features, if a dict, is filled with id -> (embedding, MinHash signature)
+    of every synopsis scored (None for failed pairs), for detect_duplicates.
+    """
+    done = load_checkpoint(checkpoint_path)
+    pending = (task for task in tasks if task[0] not in done)
+    
+    writer = ResultWriter(output_path)
+    scored = 0
+    failed = 0
+    dedupe = duplicate_features is not None
+    try:
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+                multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                                     initargs=(cascade_band, dedupe)) as pool:
+            for result in pool.imap_unordered(score_pair, pending, chunksize=chunksize):
+                features = result.pop('_duplicate_features', None)
+                if dedupe:
+                    duplicate_features[result['id']] = features
+                # Write the result before checkpointing so a kill never loses a row
+                writer.write(result)
+                if 'error' in result:
+                    failed += 1
+                else:
+                    checkpoint.write(result['id'] + '\n')
+                    checkpoint.flush()
+                scored += 1
+                if scored % 100 == 0:
+                    print(f"Scored {scored} pairs", file=sys.stderr)
+    finally:
+        writer.close()
+    
+    print(f"Scored {scored} pairs ({failed} failed and will be retried on the next run, "
+          f"{len(done)} skipped from checkpoint)", file=sys.stderr)
+    return scored
+
+def _read_duplicate_features(tasks):
+    """
+    Embeddings and signatures for synopses that were not scored in this run (skipped
+    from the checkpoint). They bypass the shared embedding cache, which holds the
+    article chunks the scoring run reuses.
+    """
+    from utils.duplicates import minhash_signatures
+    from utils.embeddings import get_batch_embeddings, load_embedding_model
+    
+    ensure_nltk_data()
+    ids = []
+    texts = []
+    for pair_id, _, synopsis_path in tasks:
+        try:
+            texts.append(anonymize_text(extract_text_from_file(synopsis_path)))
+            ids.append(pair_id)
+        except Exception as e:
+            print(f"Skipping {pair_id} in duplicate detection: {e}", file=sys.stderr)
+    if not texts:
+        return {}
+    
+    tokenizer, model = load_embedding_model()
+    embeddings = get_batch_embeddings(texts, tokenizer, model).numpy()
+    return dict(zip(ids, zip(embeddings, minhash_signatures(texts))))
+
+def detect_duplicates(tasks, report_path, duplicate_features, threshold=None, use_lsh=False):
+    """
+    Write suspected duplicate clusters for the cohort, from the embeddings and
+    signatures collected by run_batch; synopses missing there are read again.
+    """
+    import numpy as np
+    import torch
+    from utils.duplicates import DEFAULT_THRESHOLD, find_duplicates
+    
+    missing = [task for task in tasks if task[0] not in duplicate_features]
+    if missing:
+        print(f"Reading {len(missing)} synopses not scored in this run for duplicate detection", file=sys.stderr)
+        duplicate_features = dict(duplicate_features, **_read_duplicate_features(missing))
+    
+    ids = [task[0] for task in tasks if duplicate_features.get(task[0]) is not None]
+    if not ids:
+        report = {'threshold': threshold or DEFAULT_THRESHOLD, 'pairs': [], 'clusters': []}
+    else:
+        embeddings = torch.from_numpy(np.stack([duplicate_features[pair_id][0] for pair_id in ids]))
+        signatures = np.stack([duplicate_features[pair_id][1] for pair_id in ids])
+        report = find_duplicates(ids, None, embeddings, threshold=threshold or DEFAULT_THRESHOLD, use_lsh=use_lsh,
+                                 signatures=signatures)
+    
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Found {len(report['clusters'])} clusters of suspected duplicates ({len(report['pairs'])} pairs)",
+          file=sys.stderr)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score article/synopsis pairs without the Streamlit UI")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--manifest', help="CSV or JSONL file with id, article and synopsis columns")
+    source.add_argument('--input-dir', help="Directory of <id>_article.* and <id>_synopsis.txt files")
+    parser.add_argument('--output', required=True, help="Results file (.jsonl or .csv)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=4, help="Pairs handed to a worker at a time")
+    parser.add_argument('--cascade', action='store_true',
+                        help="Score clear-cut submissions lexically and run the model only on uncertain ones")
+    parser.add_argument('--uncertain-band', type=float, nargs=2, metavar=('LOW', 'HIGH'), default=None,
+                        help="Lexical score range sent to the model with --cascade (default: 30 70)")
+    parser.add_argument('--dedupe', action='store_true', help="Also report clusters of near-duplicate synopses")
+    parser.add_argument('--dedupe-threshold', type=float, default=None,
+                        help="Cosine similarity at which synopses count as duplicates (default: 0.95)")
+    parser.add_argument('--dedupe-lsh', action='store_true',
+                        help="Only compare synopses proposed by a MinHash/LSH prefilter (faster, copy-focused)")
+    parser.add_argument('--dedupe-output', help="Duplicate report (default: <output>.duplicates.json)")
+    args = parser.parse_args(argv)
+    
+    tasks = read_manifest(args.manifest) if args.manifest else scan_directory(args.input_dir)
+    if args.dedupe:
+        tasks = list(tasks)
+    checkpoint_path = args.checkpoint or args.output + '.checkpoint'
+    cascade_band = None
+    if args.cascade:
+        from utils.cascade import UNCERTAIN_BAND
+        cascade_band = tuple(args.uncertain_band or UNCERTAIN_BAND)
+    duplicate_features = {} if args.dedupe else None
+    run_batch(tasks, args.output, checkpoint_path, workers=args.workers, chunksize=args.chunksize,
+              cascade_band=cascade_band, duplicate_features=duplicate_features)
+    if args.dedupe:
+        detect_duplicates(tasks, args.dedupe_output or args.output + '.duplicates.json', duplicate_features,
+                          threshold=args.dedupe_threshold, use_lsh=args.dedupe_lsh)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Regression check and micro-benchmark for utils.privacy.anonymize_text.
+
+Checks that the single-pass anonymizer produces the same output as the original
+multi-pass implementation on a regression corpus, then times both on the corpus
+repeated --scale times and on generated prose of the same size that never repeats.
+
+Usage:
+    python benchmarks/anonymizer_benchmark.py [--repeat 20] [--scale 200]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_benchmarks import make_text, make_vocabulary
+from utils import privacy
+from utils.privacy import anonymize_text, anonymize_text_reference, ensure_nltk_data
+
+REGRESSION_CORPUS = [
+    "",
+    "   ",
+    "Hello world.",
+    "The study was led by Maria Lopez at the University of Toronto.",
+    "Contact jane.doe@example.com or call 416-555-0199 before 03/14/2024.",
+    "The report was published on March 3, 2021 and revised on Sep 12 2022.",
+    "Visit https://example.org/research?id=42 for details. It is free.",
+    "I think the results are strong. However, Smith disagrees with me.",
+    "On Monday the committee met. On Friday, they voted on the proposal.",
+    "Is this the end? No! The authors continue in section four.",
+    "He said \"Stop.\" Then he left the room with Anna and Tom.",
+    "Revenue grew 12.5% in 2020. Costs fell by 3 percent.",
+    "The meeting (held in Paris) ended early. Nobody objected.",
+    "Mr. Brown met Dr. Green at the conference on 1/2/21.",
+    "Line one of the text\nline two continues here.\n\nA new paragraph starts.",
+    "Students submitted 250 essays. The average length was 800 words.",
+    # Abbreviations, initials and ellipses where a quick split heuristic disagrees with Punkt
+    "We met at 3 p.m. Maria left.",
+    "The call ended at 9 a.m. Peter hung up first.",
+    "She finished her Ph.D. Anna was proud.",
+    "Wait... Bob is here.",
+    "He got a B. Then Smith left.",
+    "Prices rose sharply, e.g. Oil and Gas. Jones noted it.",
+    "The U.S. Army responded. Officials from the U.K. Treasury agreed.",
+    "J. R. R. Tolkien wrote it. Later, Lewis read it.",
+    "He asked \"Why?\" Nobody answered. \"Because!\" Sam said.",
+    # Breaks inside a word, which the original split into two words
+    "He said \"Stop.\"Bob left. Really?! Maria came.",
+    "The end.)Then Lee left (see [Hi.]Ann too).",
+    "See Fig. 3. Results from Table 2 (p. 4) confirm it.",
+    # URLs running into identifiers the original replaced first
+    "Archived at https://x.com/Mar 3, 2021 by Lee.",
+    "Mirror: https://example.org/a/03/14/2024/report and http://b.org/jane@example.com here.",
+]
+
+def check_regression(corpus):
+    """Return the corpus entries where the two implementations disagree"""
+    mismatches = []
+    for text in corpus:
+        expected = anonymize_text_reference(text)
+        actual = anonymize_text(text)
+        with_spans, _ = anonymize_text(text, return_spans=True)
+        if expected != actual or expected != with_spans:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare and time the anonymizer implementations")
+    parser.add_argument('--repeat', type=int, default=20, help="Timing repetitions")
+    parser.add_argument('--scale', type=int, default=200, help="Copies of the corpus in the timed document")
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    
+    mismatches = check_regression(REGRESSION_CORPUS)
+    for text, expected, actual in mismatches:
+        print(f"MISMATCH for {text!r}\n  reference: {expected!r}\n  new:       {actual!r}")
+    print(f"Regression corpus: {len(REGRESSION_CORPUS) - len(mismatches)}/{len(REGRESSION_CORPUS)} identical")
+    
+    corpus = " ".join(REGRESSION_CORPUS[2:]) * args.scale
+    prose = make_text(random.Random(0), make_vocabulary(random.Random(0)), len(corpus))
+    for name, document in (("corpus", corpus), ("prose", prose)):
+        if anonymize_text(document) != anonymize_text_reference(document):
+            print(f"MISMATCH on the {name} document")
+            mismatches.append(name)
+        # Each run starts without the windows Punkt decided in earlier runs
+        setup = privacy._window_starts.cache_clear
+        reference_time = min(timeit.repeat(lambda: anonymize_text_reference(document), setup, number=1,
+                                           repeat=args.repeat))
+        new_time = min(timeit.repeat(lambda: anonymize_text(document), setup, number=1, repeat=args.repeat))
+        
+        print(f"\n{name.capitalize()} document: {len(document) / 1024:.1f} KB")
+        print(f"Reference: {reference_time * 1000:.2f} ms")
+        print(f"Single-pass: {new_time * 1000:.2f} ms")
+        print(f"Speedup: {reference_time / new_time:.2f}x")
+    
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
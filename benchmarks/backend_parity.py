@@ -0,0 +1,108 @@
+"""
+Parity and throughput harness for the inference backends in load_embedding_model.
+
+Scores a reference set with every backend and reports how far evaluate_synopsis
+scores drift from fp32, plus scoring throughput per backend.
+
+Usage:
+    python benchmarks/backend_parity.py [--model-path DIR] [--manifest FILE] [--threads N]
+
+--manifest takes the same CSV/JSONL format as batch_score.py; without it a small
+built-in reference set is used. Pass a local --model-path to run offline.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import BACKENDS, load_embedding_model
+from utils.evaluator import evaluate_synopsis
+from utils.privacy import ensure_nltk_data
+
+REFERENCE_ARTICLE = (
+    "Urban gardens have spread quickly across many cities over the last decade. "
+    "Residents convert vacant lots into shared plots where they grow vegetables and herbs. "
+    "Researchers found that neighbourhoods with gardens report stronger social ties. "
+    "The gardens also reduce local temperatures during summer heat waves. "
+    "However, many projects struggle with unstable funding and short land leases. "
+    "City councils are beginning to include gardens in long-term planning documents. "
+    "Some schools use the plots to teach biology and nutrition. "
+    "Critics argue that gardens can raise property values and push out long-time residents. "
+    "Supporters respond that careful zoning can protect affordability. "
+    "Overall, the evidence suggests gardens deliver social and environmental benefits when they are secure."
+)
+
+REFERENCE_PAIRS = [
+    ("good", REFERENCE_ARTICLE,
+     "Urban gardens are growing in cities and turn vacant lots into shared plots. "
+     "They strengthen social ties and cool neighbourhoods, but face funding and lease problems. "
+     "Planners and schools are adopting them, though critics worry about rising property values."),
+    ("partial", REFERENCE_ARTICLE,
+     "Gardens in cities grow vegetables. Some schools use them for teaching."),
+    ("off_topic", REFERENCE_ARTICLE,
+     "The football season ended with a dramatic final match decided by penalties. "
+     "Fans celebrated in the streets until late at night."),
+    ("empty", REFERENCE_ARTICLE, "Ok."),
+]
+
+def load_pairs(manifest_path):
+    """Load (id, article_text, synopsis_text) from a batch_score.py manifest"""
+    from batch_score import read_manifest
+    from utils.file_utils import extract_text_from_file
+    return [(pair_id, extract_text_from_file(article), extract_text_from_file(synopsis))
+            for pair_id, article, synopsis in read_manifest(manifest_path)]
+
+def score_all(pairs, tokenizer, model):
+    """Score every pair, returning results and elapsed seconds"""
+    cache = get_embedding_cache()
+    results = {}
+    start = time.perf_counter()
+    for pair_id, article, synopsis in pairs:
+        cache.clear()  # Time inference, not cache hits
+        results[pair_id] = evaluate_synopsis(article, synopsis, tokenizer, model)
+    return results, time.perf_counter() - start
+
+def drift(reference, candidate):
+    """Max and mean absolute difference in final and per-metric scores"""
+    diffs = {'final_score': []}
+    for pair_id, expected in reference.items():
+        actual = candidate[pair_id]
+        diffs['final_score'].append(abs(actual['final_score'] - expected['final_score']))
+        for metric, value in expected['detailed_scores'].items():
+            diffs.setdefault(metric, []).append(abs(actual['detailed_scores'][metric] - value))
+    return {metric: (max(values), sum(values) / len(values)) for metric, values in diffs.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference backends against fp32")
+    parser.add_argument('--model-path', help="Hub name or local model directory")
+    parser.add_argument('--manifest', help="Reference set in batch_score.py manifest format")
+    parser.add_argument('--threads', type=int, help="Intra-op thread count")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    pairs = load_pairs(args.manifest) if args.manifest else REFERENCE_PAIRS
+    backends = ['fp32'] + [backend for backend in args.backends if backend != 'fp32']
+    
+    timings = {}
+    reference = None
+    for backend in backends:
+        tokenizer, model = load_embedding_model(backend=backend, model_path=args.model_path,
+                                                num_threads=args.threads)
+        score_all(pairs[:1], tokenizer, model)  # Warm-up
+        results, elapsed = score_all(pairs, tokenizer, model)
+        timings[backend] = elapsed
+        
+        print(f"\n== {backend}: {len(pairs) / elapsed:.2f} pairs/s "
+              f"({timings['fp32'] / elapsed:.2f}x fp32)")
+        if reference is None:
+            reference = results
+            continue
+        for metric, (max_diff, mean_diff) in drift(reference, results).items():
+            print(f"  {metric:<18} max drift {max_diff:6.2f}  mean drift {mean_diff:6.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Calibration report for cascade scoring (utils/cascade.py).
+
+Scores a reference set both ways: the lexical tier alone and full MiniLM
+scoring. Reports how often the cascade would settle a submission lexically
+(inference saved), how closely those scores agree with full scoring, and the
+wall time of full versus cascade scoring. It also fits LEXICAL_BASE and
+LEXICAL_SCALE to the observed chunk similarities. The lexical tier scores sentence
+chunks, so the fit pairs each lexical cosine with the model's similarity for the
+same sentence chunk, not with the token windows full scoring uses by default.
+
+Usage:
+    python benchmarks/cascade_calibration.py [--manifest FILE] [--model-path DIR] [--band 30 70]
+
+--manifest takes the same CSV/JSONL format as batch_score.py; without it the
+small built-in reference set from backend_parity.py is used.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.backend_parity import REFERENCE_PAIRS, load_pairs
+from utils import cascade
+from utils.document import ParsedDocument
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import compute_chunk_similarities, load_embedding_model
+from utils.evaluator import score_synopsis
+from utils.privacy import ensure_nltk_data
+
+def calibrate(pairs, tokenizer, model, band):
+    """Score every pair lexically and with the model; returns per-pair rows and fit samples"""
+    cache = get_embedding_cache()
+    rows = []
+    samples = []  # (sqrt TF-IDF cosine, model similarity) per chunk
+    for pair_id, article_text, synopsis_text in pairs:
+        article = ParsedDocument(article_text)
+        synopsis = ParsedDocument(synopsis_text)
+        
+        start = time.perf_counter()
+        lexical_index = cascade.LexicalIndex.build(article)
+        estimate = lexical_index.evaluate(synopsis)
+        lexical_seconds = time.perf_counter() - start
+        
+        cache.clear()  # Time inference, not cache hits
+        start = time.perf_counter()
+        chunk_similarities, avg_similarity = compute_chunk_similarities(article, synopsis, tokenizer, model)
+        full = score_synopsis(chunk_similarities, avg_similarity, article.word_count, synopsis)
+        model_seconds = time.perf_counter() - start
+        
+        chunk_cosines, _ = lexical_index.signals(synopsis)
+        sentence_similarities, _ = compute_chunk_similarities(article, synopsis, tokenizer, model, chunking="sentences")
+        if len(sentence_similarities) != len(chunk_cosines):
+            raise ValueError(f"{pair_id}: {len(chunk_cosines)} lexical chunks but "
+                             f"{len(sentence_similarities)} sentence chunks")
+        samples.extend((math.sqrt(cosine), similarity)
+                       for cosine, similarity in zip(chunk_cosines, sentence_similarities))
+        
+        tier = 'model' if cascade.needs_model(estimate, band) else 'lexical'
+        rows.append({
+            'id': pair_id,
+            'lexical': estimate['final_score'],
+            'full': full['final_score'],
+            'tier': tier,
+            'cascade': full['final_score'] if tier == 'model' else estimate['final_score'],
+            'lexical_seconds': lexical_seconds,
+            'model_seconds': model_seconds,
+        })
+    return rows, samples
+
+def fit_mapping(samples):
+    """Least-squares BASE and SCALE for similarity ~ BASE + SCALE * sqrt(cosine)"""
+    n = len(samples)
+    mean_x = sum(x for x, _ in samples) / n
+    mean_y = sum(y for _, y in samples) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in samples)
+    if variance == 0:
+        return mean_y, 0.0
+    scale = sum((x - mean_x) * (y - mean_y) for x, y in samples) / variance
+    return mean_y - scale * mean_x, scale
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare cascade scoring against full MiniLM scoring")
+    parser.add_argument('--manifest', help="Reference set in batch_score.py manifest format")
+    parser.add_argument('--model-path', help="Hub name or local model directory")
+    parser.add_argument('--band', type=float, nargs=2, metavar=('LOW', 'HIGH'), default=cascade.UNCERTAIN_BAND,
+                        help="Uncertain lexical score band sent to the model")
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help="Max score difference that still counts as agreement")
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    pairs = load_pairs(args.manifest) if args.manifest else REFERENCE_PAIRS
+    tokenizer, model = load_embedding_model(model_path=args.model_path)
+    calibrate(pairs[:1], tokenizer, model, args.band)  # Warm-up
+    rows, samples = calibrate(pairs, tokenizer, model, args.band)
+    
+    print(f"{'id':<20} {'lexical':>8} {'full':>8} {'cascade':>8}  tier")
+    for row in rows:
+        print(f"{row['id']:<20} {row['lexical']:8.1f} {row['full']:8.1f} {row['cascade']:8.1f}  {row['tier']}")
+    
+    settled = [row for row in rows if row['tier'] == 'lexical']
+    differences = [abs(row['cascade'] - row['full']) for row in rows]
+    full_seconds = sum(row['model_seconds'] for row in rows)
+    cascade_seconds = sum(row['lexical_seconds'] + (row['model_seconds'] if row['tier'] == 'model' else 0)
+                          for row in rows)
+    
+    print(f"\nSettled by the lexical tier: {len(settled)}/{len(rows)} ({len(settled) / len(rows):.0%} of inference saved)")
+    if settled:
+        lexical_differences = [abs(row['cascade'] - row['full']) for row in settled]
+        print(f"Lexical-tier error vs full: max {max(lexical_differences):.1f}  "
+              f"mean {sum(lexical_differences) / len(lexical_differences):.1f}")
+    agreeing = sum(1 for difference in differences if difference <= args.tolerance)
+    print(f"Cascade within {args.tolerance:g} points of full scoring: {agreeing}/{len(rows)}")
+    print(f"Wall time: full {full_seconds:.2f}s, cascade {cascade_seconds:.2f}s "
+          f"({full_seconds / max(cascade_seconds, 1e-9):.1f}x)")
+    
+    base, scale = fit_mapping(samples)
+    print(f"\nFitted mapping from {len(samples)} chunks (current {cascade.LEXICAL_BASE}, {cascade.LEXICAL_SCALE}):")
+    print(f"LEXICAL_BASE = {base:.3f}\nLEXICAL_SCALE = {scale:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold-start report: how long a fresh process takes to import the app and to
+produce its first score.
+
+Each measurement runs in a new Python process so module caches don't hide the
+cost. Reported:
+    import_app_main   - `import app_main` (heavy libraries should stay unloaded)
+    heavy_modules     - whether torch/transformers/nltk were imported by it
+    model_ready       - background warm-up (model load + one inference) finished
+    first_score       - first evaluate_synopsis call after warm-up
+
+Usage:
+    python benchmarks/cold_start.py [--tiny-model] [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, sys, time
+sys.path.insert(0, ROOT)
+start = time.perf_counter()
+import app_main
+import_seconds = time.perf_counter() - start
+heavy = sorted(name for name in ("torch", "transformers", "nltk") if name in sys.modules)
+
+from utils import warmup
+warmup.start_background_warmup()
+tokenizer, model = warmup.get_model()
+ready_seconds = time.perf_counter() - start
+
+from utils.evaluator import evaluate_synopsis
+score_start = time.perf_counter()
+evaluate_synopsis(ARTICLE, SYNOPSIS, tokenizer, model)
+first_score_seconds = time.perf_counter() - score_start
+
+print(json.dumps({"import_app_main": import_seconds, "heavy_modules": heavy,
+                  "model_ready": ready_seconds, "first_score": first_score_seconds}))
+'''
+
+ARTICLE = ("Urban gardens have spread quickly across many cities over the last decade. "
+           "Residents convert vacant lots into shared plots where they grow vegetables. "
+           "Researchers found that neighbourhoods with gardens report stronger social ties. ") * 5
+SYNOPSIS = "Urban gardens turn vacant lots into shared plots and strengthen social ties."
+
+def run_probe(env):
+    code = f"ROOT = {ROOT!r}\nARTICLE = {ARTICLE!r}\nSYNOPSIS = {SYNOPSIS!r}\n" + PROBE
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time to first score")
+    parser.add_argument('--runs', type=int, default=3, help="Fresh processes to measure")
+    parser.add_argument('--tiny-model', action='store_true', help="Use a small random local model (offline)")
+    args = parser.parse_args(argv)
+    
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.tiny_model:
+            sys.path.insert(0, ROOT)
+            from benchmarks.run_benchmarks import build_tiny_model, make_vocabulary
+            import random
+            env['SYNOPSIS_MODEL_PATH'] = workdir
+            build_tiny_model(workdir, make_vocabulary(random.Random(0)))
+        
+        results = [run_probe(env) for _ in range(args.runs)]
+    
+    print(f"Heavy modules loaded by `import app_main`: {', '.join(results[0]['heavy_modules']) or 'none'}")
+    for metric in ('import_app_main', 'model_ready', 'first_score'):
+        values = [result[metric] for result in results]
+        print(f"{metric:<16} median {statistics.median(values) * 1000:9.1f} ms  "
+              f"min {min(values) * 1000:9.1f} ms  max {max(values) * 1000:9.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Latency of re-scoring a synopsis after a one-sentence edit (utils/incremental.py).
+
+Scores a synopsis once, then applies a series of single-sentence edits
+(replace, insert, delete) and times each re-score with the IncrementalScorer
+against a fresh evaluate_synopsis of the same text. Every incremental result is
+checked against the fresh one, so a speed-up never comes from a wrong score.
+
+Usage:
+    python benchmarks/incremental_rescoring.py [--tiny-model] [--model-path DIR] [--sentences 40] [--edits 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_benchmarks import build_tiny_model, make_text, make_vocabulary
+from utils.document import ParsedDocument
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import load_embedding_model
+from utils.evaluator import evaluate_synopsis
+from utils.incremental import IncrementalScorer
+from utils.privacy import ensure_nltk_data
+
+COMPARED_FIELDS = ('final_score', 'chunk_coverage', 'chunk_best_sentence', 'sentence_alignment')
+
+def edit_once(rng, vocabulary, sentences):
+    """One replaced, inserted or deleted sentence"""
+    sentences = list(sentences)
+    position = rng.randrange(len(sentences))
+    operation = rng.choice(('replace', 'insert', 'delete') if len(sentences) > 1 else ('replace', 'insert'))
+    if operation == 'delete':
+        del sentences[position]
+    else:
+        sentence = make_text(rng, vocabulary, 120).rsplit(' ', 1)[0] + '.'
+        sentences[position:position + (operation == 'replace')] = [sentence]
+    return sentences
+
+def agree(incremental, fresh, tolerance=1e-3):
+    for field in COMPARED_FIELDS:
+        left, right = incremental[field], fresh[field]
+        if field in ('final_score', 'chunk_coverage'):
+            left, right = (left, right) if isinstance(left, list) else ([left], [right])
+            if len(left) != len(right) or any(abs(a - b) > tolerance for a, b in zip(left, right)):
+                return False
+        elif left != right:
+            return False
+    return True
+
+def run(tokenizer, model, vocabulary, sentences, edits, seed):
+    rng = random.Random(seed)
+    article = ParsedDocument(make_text(rng, vocabulary, 20000))
+    synopsis = ParsedDocument(make_text(rng, vocabulary, 120 * sentences))
+    scorer = IncrementalScorer(article, tokenizer, model)
+    scorer.score(synopsis, scoring_mode="sentence_matrix")
+    
+    cache = get_embedding_cache()
+    incremental_seconds, fresh_seconds, mismatches = [], [], 0
+    current = synopsis.sentences
+    for _ in range(edits):
+        current = edit_once(rng, vocabulary, current)
+        edited = ParsedDocument(' '.join(current))
+        current = edited.sentences
+        
+        start = time.perf_counter()
+        incremental = scorer.score(edited, scoring_mode="sentence_matrix")
+        incremental_seconds.append(time.perf_counter() - start)
+        
+        cache.clear()  # A fresh score after an edit misses the cache for the edited text anyway
+        start = time.perf_counter()
+        fresh = evaluate_synopsis(article, edited, tokenizer, model, scoring_mode="sentence_matrix")
+        fresh_seconds.append(time.perf_counter() - start)
+        mismatches += not agree(incremental, fresh)
+    return incremental_seconds, fresh_seconds, mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time one-sentence edits: incremental vs fresh scoring")
+    parser.add_argument('--model-path', help="Hub name or local model directory")
+    parser.add_argument('--tiny-model', action='store_true', help="Use a small random local model (offline)")
+    parser.add_argument('--sentences', type=int, default=40, help="Approximate synopsis length in sentences")
+    parser.add_argument('--edits', type=int, default=20, help="Number of one-sentence edits to time")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    vocabulary = make_vocabulary(random.Random(args.seed))
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = args.model_path
+        if args.tiny_model:
+            model_path = os.path.join(workdir, 'model')
+            os.makedirs(model_path)
+            build_tiny_model(model_path, vocabulary, seed=args.seed)
+        tokenizer, model = load_embedding_model(model_path=model_path)
+        incremental, fresh, mismatches = run(tokenizer, model, vocabulary, args.sentences, args.edits, args.seed)
+    
+    ms = lambda seconds: f"{seconds * 1000:8.1f} ms"
+    print(f"{'':<12} {'median':>11} {'max':>11}")
+    print(f"{'incremental':<12} {ms(statistics.median(incremental))} {ms(max(incremental))}")
+    print(f"{'fresh':<12} {ms(statistics.median(fresh))} {ms(max(fresh))}")
+    print(f"\nSpeed-up on a one-sentence edit: {statistics.median(fresh) / statistics.median(incremental):.1f}x")
+    print(f"Results differing from a fresh score: {mismatches}/{len(incremental)}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Reproducible performance benchmarks for the scoring pipeline.
+
+Generates synthetic articles and synopses of controlled sizes (TXT and PDF) and
+times each stage on its own -- extract_text_from_file, anonymize_text,
+compute_chunk_similarities, evaluate_synopsis -- plus the end-to-end path.
+Reports throughput, p50/p95 latency and peak RSS, and can save a baseline JSON
+that later runs are compared against.
+
+Usage:
+    python benchmarks/run_benchmarks.py --tiny-model --save-baseline baseline.json
+    python benchmarks/run_benchmarks.py --tiny-model --compare baseline.json --threshold 0.2
+
+--tiny-model builds a small randomly initialised BERT in a temporary directory,
+so the suite runs offline; its scores are meaningless but its timings track the
+pipeline code. Without it, the configured model (SYNOPSIS_MODEL_PATH) is used.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import compute_chunk_similarities, load_embedding_model
+from utils.evaluator import evaluate_synopsis
+from utils.file_utils import clear_pdf_cache, extract_text_from_file
+from utils.privacy import anonymize_text, ensure_nltk_data
+
+DEFAULT_SIZES = "1KB,10KB,100KB,1MB"
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 * 1024}
+STAGES = ['extract', 'anonymize', 'chunk_similarities', 'evaluate', 'end_to_end']
+
+SYLLABLES = ['ba', 'ce', 'di', 'fo', 'gu', 'ha', 'je', 'ki', 'lo', 'mu', 'na', 're', 'si', 'to', 'vu', 'xa', 'ze']
+NAMES = ['Alice', 'Bruno', 'Chen', 'Dana', 'Emeka', 'Farah', 'Goran', 'Hana']
+
+def parse_size(text):
+    """Parse sizes such as '10KB' or '5MB' into bytes"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def make_vocabulary(rng, size=2000):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+def make_text(rng, vocabulary, target_bytes):
+    """Generate sentences until the text reaches target_bytes"""
+    sentences = []
+    size = 0
+    while size < target_bytes:
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(8, 25))]
+        if rng.random() < 0.3:
+            words[rng.randrange(1, len(words))] = rng.choice(NAMES)
+        if rng.random() < 0.05:
+            words.append(f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/20{rng.randint(10, 29)}")
+        sentence = ' '.join(words).capitalize() + '.'
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return ' '.join(sentences)[:target_bytes]
+
+def write_pdf(path, text, chars_per_line=120, lines_per_page=100):
+    """Write a minimal PDF with the text laid out in Helvetica, no external libraries"""
+    words = text.split()
+    lines = []
+    current = ''
+    for word in words:
+        if current and len(current) + len(word) + 1 > chars_per_line:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) per page
+    objects = {}
+    page_ids = []
+    for index, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * index, 5 + 2 * index
+        page_ids.append(page_id)
+        escaped = (line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for line in page_lines)
+        stream = "BT /F1 7 Tf 8 TL 20 800 Td " + ' '.join(f"({line}) Tj T*" for line in escaped) + " ET"
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+    objects[1] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+    objects[3] = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode('latin-1')
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for object_id in sorted(objects):
+        output += f"{offsets[object_id]:010d} 00000 n \n".encode('latin-1')
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(output)
+
+def build_tiny_model(directory, vocabulary, seed=0):
+    """Save a small randomly initialised BERT and a matching WordPiece tokenizer"""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizer
+    
+    special = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+    characters = sorted(set('abcdefghijklmnopqrstuvwxyz0123456789.,/[]'))
+    tokens = special + characters + ['##' + c for c in characters] + [w.lower() for w in NAMES] + vocabulary
+    vocab_path = os.path.join(directory, 'vocab.txt')
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(dict.fromkeys(tokens)) + '\n')
+    BertTokenizer(vocab_path).save_pretrained(directory)
+    
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(set(tokens)), hidden_size=32, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=64, max_position_embeddings=512)
+    BertModel(config).save_pretrained(directory)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+def time_stage(func, repeat, before=None):
+    """Run func repeat times and return latencies in seconds"""
+    latencies = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def reset_caches():
+    """Make every repetition do the full work"""
+    get_embedding_cache().clear()
+    clear_pdf_cache()
+
+def benchmark_case(article_path, synopsis_path, tokenizer, model, repeat):
+    """Time every stage for one article/synopsis pair"""
+    article_text = extract_text_from_file(article_path)
+    synopsis_text = extract_text_from_file(synopsis_path)
+    anonymized_article = anonymize_text(article_text)
+    anonymized_synopsis = anonymize_text(synopsis_text)
+    input_bytes = os.path.getsize(article_path) + os.path.getsize(synopsis_path)
+    
+    def end_to_end():
+        article = anonymize_text(extract_text_from_file(article_path))
+        synopsis = anonymize_text(extract_text_from_file(synopsis_path))
+        evaluate_synopsis(article, synopsis, tokenizer, model)
+    
+    stages = {
+        'extract': (lambda: (extract_text_from_file(article_path), extract_text_from_file(synopsis_path)),
+                    input_bytes),
+        'anonymize': (lambda: (anonymize_text(article_text), anonymize_text(synopsis_text)),
+                      len(article_text) + len(synopsis_text)),
+        'chunk_similarities': (lambda: compute_chunk_similarities(anonymized_article, anonymized_synopsis,
+                                                                  tokenizer, model),
+                               len(anonymized_article) + len(anonymized_synopsis)),
+        'evaluate': (lambda: evaluate_synopsis(anonymized_article, anonymized_synopsis, tokenizer, model),
+                     len(anonymized_article) + len(anonymized_synopsis)),
+        'end_to_end': (end_to_end, input_bytes),
+    }
+    
+    results = {}
+    for stage in STAGES:
+        func, processed_bytes = stages[stage]
+        latencies = time_stage(func, repeat, before=reset_caches)
+        p50 = percentile(latencies, 0.5)
+        results[stage] = {
+            'runs': len(latencies),
+            'p50_ms': p50 * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'throughput_mb_s': processed_bytes / (1024 * 1024) / p50 if p50 > 0 else 0.0,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    return results
+
+def compare(results, baseline, threshold):
+    """Return (case, stage, baseline_ms, current_ms) for p50 latencies that regressed beyond threshold"""
+    regressions = []
+    for case, stages in results.items():
+        for stage, metrics in stages.items():
+            previous = baseline.get(case, {}).get(stage)
+            if previous and metrics['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+                regressions.append((case, stage, previous['p50_ms'], metrics['p50_ms']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline stage by stage")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated article sizes, e.g. 1KB,100KB,5MB")
+    parser.add_argument('--formats', default='txt,pdf', help="Article formats to generate")
+    parser.add_argument('--repeat', type=int, default=5, help="Repetitions per stage")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--tiny-model', action='store_true', help="Use a small random local model (offline)")
+    parser.add_argument('--model-path', help="Local model directory or hub name")
+    parser.add_argument('--save-baseline', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p50 slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = args.model_path
+        if args.tiny_model:
+            model_path = os.path.join(workdir, 'tiny-model')
+            os.makedirs(model_path)
+            build_tiny_model(model_path, vocabulary, seed=args.seed)
+        tokenizer, model = load_embedding_model(model_path=model_path)
+        
+        results = {}
+        for size_text in args.sizes.split(','):
+            size = parse_size(size_text)
+            article = make_text(rng, vocabulary, size)
+            synopsis = make_text(rng, vocabulary, max(200, min(size // 5, 20 * 1024)))
+            synopsis_path = os.path.join(workdir, f'synopsis_{size}.txt')
+            with open(synopsis_path, 'w', encoding='utf-8') as f:
+                f.write(synopsis)
+            
+            for fmt in args.formats.split(','):
+                article_path = os.path.join(workdir, f'article_{size}.{fmt}')
+                if fmt == 'pdf':
+                    write_pdf(article_path, article)
+                else:
+                    with open(article_path, 'w', encoding='utf-8') as f:
+                        f.write(article)
+                
+                case = f"{size_text.strip()}-{fmt}"
+                results[case] = benchmark_case(article_path, synopsis_path, tokenizer, model, args.repeat)
+                
+                print(f"\n== {case}")
+                for stage, metrics in results[case].items():
+                    print(f"  {stage:<20} p50 {metrics['p50_ms']:9.2f} ms  p95 {metrics['p95_ms']:9.2f} ms  "
+                          f"{metrics['throughput_mb_s']:8.3f} MB/s  peak RSS {metrics['peak_rss_mb']:8.1f} MB")
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for case, stage, before, after in regressions:
+            print(f"REGRESSION {case} {stage}: {before:.2f} ms -> {after:.2f} ms")
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
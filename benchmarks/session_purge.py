@@ -0,0 +1,108 @@
+"""
+Check that a session's data leaves the shared caches when the session ends.
+
+Two sessions each upload a PDF and score a synopsis with the IncrementalScorer,
+recording the embeddings they add as app_main does. One of them is then ended in
+each way a session can end: "Clear my data" (drop), idling past the TTL
+(expire_idle on the next get) and eviction under the memory budget (account).
+Its PDF text and embeddings must be gone from the shared caches, and the other
+session's must still be there.
+
+Usage:
+    python benchmarks/session_purge.py [--tiny-model] [--model-path DIR]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_benchmarks import build_tiny_model, make_text, make_vocabulary, write_pdf
+from utils import file_utils
+from utils.document import ParsedDocument
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import load_embedding_model
+from utils.incremental import IncrementalScorer
+from utils.privacy import ensure_nltk_data
+from utils.result_cache import content_hash
+from utils.session_state import SessionStore
+
+def end_by_drop(store, ended, kept):
+    store.drop(ended)
+
+def end_by_idling(store, ended, kept):
+    store.sessions[ended].last_access -= store.idle_ttl_seconds + 1
+    store.get(kept)
+
+def end_by_eviction(store, ended, kept):
+    store.max_bytes = 1
+    store.account(kept)
+
+ENDINGS = (("clear my data", end_by_drop), ("idle timeout", end_by_idling), ("memory budget", end_by_eviction))
+
+def run_session(store, session_id, pdf_path, synopsis_text, tokenizer, model):
+    """Upload and score as app_main does; returns the session's state"""
+    state = store.get(session_id, upload_hashes=set(), embedding_keys=set())
+    with open(pdf_path, 'rb') as f:
+        data = f.read()
+    state.upload_hashes.add(content_hash(data))
+    article = ParsedDocument(file_utils.read_pdf_bytes(data))
+    with get_embedding_cache().recording(state.embedding_keys):
+        state.incremental_scorer = IncrementalScorer(article, tokenizer, model)
+        state.incremental_scorer.score(ParsedDocument(synopsis_text), scoring_mode="sentence_matrix")
+    return state
+
+def held(state):
+    """How many of the session's PDF texts and embeddings the shared caches still hold"""
+    cache = get_embedding_cache()
+    return (sum(digest in file_utils._pdf_text_cache for digest in state.upload_hashes),
+            sum(key in cache.memory for key in state.embedding_keys))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that ending a session purges its shared cache entries")
+    parser.add_argument('--model-path', help="Hub name or local model directory")
+    parser.add_argument('--tiny-model', action='store_true', help="Use a small random local model (offline)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(random.Random(args.seed))
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = args.model_path
+        if args.tiny_model:
+            model_path = os.path.join(workdir, 'model')
+            os.makedirs(model_path)
+            build_tiny_model(model_path, vocabulary, seed=args.seed)
+        tokenizer, model = load_embedding_model(model_path=model_path)
+        
+        uploads = {}
+        for session_id in ('ended', 'kept'):
+            pdf_path = os.path.join(workdir, f'{session_id}.pdf')
+            write_pdf(pdf_path, make_text(rng, vocabulary, 20000))
+            uploads[session_id] = (pdf_path, make_text(rng, vocabulary, 1200))
+        
+        for name, end_session in ENDINGS:
+            file_utils.clear_pdf_cache()
+            get_embedding_cache().clear()
+            store = SessionStore()
+            states = {session_id: run_session(store, session_id, *uploads[session_id], tokenizer, model)
+                      for session_id in ('ended', 'kept')}
+            recorded = len(states['ended'].embedding_keys)
+            
+            end_session(store, 'ended', 'kept')
+            ended, kept = held(states['ended']), held(states['kept'])
+            ok = (recorded > 0 and 'ended' not in store.sessions and ended == (0, 0)
+                  and kept == (1, len(states['kept'].embedding_keys)))
+            failures += not ok
+            print(f"{name:<14} recorded {recorded:3d} embeddings  "
+                  f"ended session holds {ended[0]} PDF / {ended[1]} embeddings, "
+                  f"other session {kept[0]} PDF / {kept[1]} embeddings  {'OK' if ok else 'FAIL'}")
+    
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Per-process memory with and without shared model weights.
+
+Starts several worker processes that each load the embedding model at the same
+time, as separate server processes on one node would, and reports every
+process's resident memory before and after loading. PSS (proportional set
+size, from /proc/self/smaps_rollup) divides shared pages between the processes
+that map them, so its sum is the real cost to the node.
+
+Usage:
+    python benchmarks/shared_weights.py [--workers 4] [--tiny-model] [--model-path DIR]
+"""
+import argparse
+import importlib
+import multiprocessing
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def proportional_memory():
+    """This process's PSS in bytes, or None where smaps_rollup is unavailable"""
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _worker(model_path, shared_weights_dir, barrier, results):
+    from utils.shared_weights import resident_memory
+    # Load the libraries before measuring, so "before" includes them as in a running server
+    for library in ('torch', 'transformers'):
+        importlib.import_module(library)
+    
+    before = resident_memory().get('rss')
+    from utils.embeddings import get_batch_embeddings, load_embedding_model
+    tokenizer, model = load_embedding_model(model_path=model_path, shared_weights_dir=shared_weights_dir)
+    get_batch_embeddings(["Warm-up sentence for the memory report."], tokenizer, model)
+    
+    # Measure while every worker holds its model, so shared pages are actually shared
+    barrier.wait()
+    after = resident_memory()
+    results.put({'pid': os.getpid(), 'before': before, 'after': after.get('rss'),
+                 'file': after.get('file'), 'pss': proportional_memory()})
+    barrier.wait()
+
+def measure(workers, model_path, shared_weights_dir):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(model_path, shared_weights_dir, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+def report(title, rows):
+    mb = 1024 * 1024
+    print(f"\n== {title}")
+    print(f"{'pid':>8} {'rss before':>11} {'rss after':>10} {'file-backed':>12} {'pss':>8}")
+    for row in rows:
+        pss = f"{row['pss'] / mb:7.0f}M" if row['pss'] is not None else "     n/a"
+        print(f"{row['pid']:>8} {row['before'] / mb:10.0f}M {row['after'] / mb:9.0f}M {row['file'] / mb:11.0f}M {pss}")
+    if all(row['pss'] is not None for row in rows):
+        print(f"Total PSS across workers: {sum(row['pss'] for row in rows) / mb:.0f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare worker memory with private and shared model weights")
+    parser.add_argument('--workers', type=int, default=4, help="Processes loading the model at once")
+    parser.add_argument('--model-path', help="Hub name or local model directory")
+    parser.add_argument('--tiny-model', action='store_true', help="Use a small random local model (offline)")
+    args = parser.parse_args(argv)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = args.model_path
+        if args.tiny_model:
+            from benchmarks.run_benchmarks import build_tiny_model, make_vocabulary
+            import random
+            model_path = os.path.join(workdir, 'model')
+            os.makedirs(model_path)
+            build_tiny_model(model_path, make_vocabulary(random.Random(0)))
+        
+        report("Private weights (one copy per process)", measure(args.workers, model_path, None))
+        report("Shared weights (memory-mapped)", measure(args.workers, model_path, os.path.join(workdir, 'weights')))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Check that article text past the model's 512-token limit still affects the score.
+
+Builds two articles that are identical except for text well past token 512 of one
+long passage, and scores the same synopsis against both with every chunking mode.
+With the default token windows the chunk similarities (and so the score) must
+differ; with chunking="sentences" the changed text is truncated away and they
+come out the same.
+
+Usage:
+    python benchmarks/token_windows.py [--tiny-model] [--model-path DIR]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_benchmarks import build_tiny_model, make_vocabulary
+from utils.document import ParsedDocument
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import DEFAULT_CHUNKING, MAX_MODEL_TOKENS, compute_chunk_similarities, load_embedding_model
+from utils.evaluator import score_synopsis
+from utils.privacy import ensure_nltk_data
+
+def make_articles(rng, vocabulary, tokenizer):
+    """Two articles whose only difference lies past MAX_MODEL_TOKENS of their first passage"""
+    words = []
+    while len(tokenizer(' '.join(words), add_special_tokens=False)['input_ids']) < MAX_MODEL_TOKENS + 200:
+        words.append(rng.choice(vocabulary))
+    tail = len(words) // 4
+    # One long passage without sentence breaks, so sentence chunking can't split it
+    passage = ' '.join(words[:-tail]).capitalize()
+    tails = [' '.join(rng.choice(vocabulary) for _ in range(tail)) for _ in range(2)]
+    rest = ' '.join(' '.join(rng.choice(vocabulary) for _ in range(12)).capitalize() + '.' for _ in range(9))
+    return [ParsedDocument(f"{passage} {ending}. {rest}") for ending in tails]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that text past token 512 affects the score")
+    parser.add_argument('--model-path', help="Hub name or local model directory")
+    parser.add_argument('--tiny-model', action='store_true', help="Use a small random local model (offline)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    ensure_nltk_data()
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(random.Random(args.seed))
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = args.model_path
+        if args.tiny_model:
+            model_path = os.path.join(workdir, 'model')
+            os.makedirs(model_path)
+            build_tiny_model(model_path, vocabulary, seed=args.seed)
+        tokenizer, model = load_embedding_model(model_path=model_path)
+    
+    articles = make_articles(rng, vocabulary, tokenizer)
+    synopsis = ParsedDocument(' '.join(articles[0].sentences[:1])[:400] + '.')
+    changed = {}
+    for chunking in ("tokens", "sentences"):
+        scores = []
+        for article in articles:
+            get_embedding_cache().clear()
+            similarities, average = compute_chunk_similarities(article, synopsis, tokenizer, model, chunking=chunking)
+            scores.append((score_synopsis(similarities, average, article.word_count, synopsis)['final_score'],
+                           average))
+        changed[chunking] = abs(scores[0][1] - scores[1][1]) > 1e-6
+        default = " (default)" if chunking == DEFAULT_CHUNKING else ""
+        print(f"{chunking + default:<20} scores {scores[0][0]:5.1f} / {scores[1][0]:5.1f}  "
+              f"mean similarity {scores[0][1]:.4f} / {scores[1][1]:.4f}  "
+              f"{'tail counted' if changed[chunking] else 'tail truncated'}")
+    
+    if not changed[DEFAULT_CHUNKING]:
+        print(f"FAIL: text past token {MAX_MODEL_TOKENS} does not affect default scoring")
+        return 1
+    print(f"OK: text past token {MAX_MODEL_TOKENS} affects default scoring")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Standalone asynchronous HTTP scoring service.
+
+Concurrent scoring requests share one model: their embedding work is merged into
+micro-batches and run on a dedicated inference thread (see utils/batching.py).
+
+Usage:
+    python scoring_service.py --port 8600 --max-batch-size 64 --max-wait-ms 10
+
+Endpoints:
+    POST /score   {"article": "...", "synopsis": "...", "anonymize": true}
+    GET  /health  readiness and queue depth
+    GET  /metrics per-stage timings in Prometheus text format (with --trace)
+
+When the inference queue is full the service answers 503 with Retry-After, so
+callers back off instead of piling up work. Point the Streamlit app at it with
+SCORING_SERVICE_URL=http://host:8600.
+"""
+import argparse
+import asyncio
+import json
+
+from utils.batching import MicroBatcher, QueueFullError
+from utils.document import ParsedDocument
+from utils.embeddings import load_embedding_model, split_article
+from utils.evaluator import score_synopsis
+from utils.privacy import anonymize_text, ensure_nltk_data
+from utils import tracing
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class ScoringService:
+    """Score synopses with embeddings computed through a shared MicroBatcher"""
+
+    def __init__(self, batcher, max_body_bytes=MAX_BODY_BYTES):
+        self.batcher = batcher
+        self.max_body_bytes = max_body_bytes
+
+    async def score(self, article_text, synopsis_text, anonymize=True):
+        """Same steps as evaluate_synopsis, with the embedding pass batched across requests"""
+        loop = asyncio.get_running_loop()
+        
+        def prepare():
+            # CPU-bound text work runs off the event loop
+            article = ParsedDocument(anonymize_text(article_text) if anonymize else article_text)
+            synopsis = ParsedDocument(anonymize_text(synopsis_text) if anonymize else synopsis_text)
+            chunks, chunk_ids = split_article(article, self.batcher.tokenizer)
+            if not chunks:
+                raise ValueError("article has no text to score")
+            return article, synopsis, chunks, chunk_ids
+        
+        article, synopsis, chunks, chunk_ids = await loop.run_in_executor(None, prepare)
+        # Token windows are already tokenized; passing their ids skips tokenizing them again
+        embeddings = await self.batcher.embed([synopsis.text] + chunks, token_ids=[None] + chunk_ids)
+        
+        chunk_similarities = (embeddings[1:] @ embeddings[0]).tolist()
+        avg_similarity = sum(chunk_similarities) / len(chunk_similarities)
+        return score_synopsis(chunk_similarities, avg_similarity, article.word_count, synopsis)
+
+    async def handle(self, reader, writer):
+        """Serve one HTTP request per connection"""
+        try:
+            status, payload, headers = await self._dispatch(reader)
+        except Exception as e:
+            status, payload, headers = 500, {'error': str(e)}, {}
+        
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode('utf-8'), "application/json"
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                "Connection: close"]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        try:
+            raw_head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return 400, {'error': 'malformed request'}, {}
+        
+        lines = raw_head.decode('latin-1').split("\r\n")
+        parts = lines[0].split()
+        if len(parts) < 2:
+            return 400, {'error': 'malformed request line'}, {}
+        method, path = parts[0], parts[1]
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        
+        if path == '/health':
+            return 200, {'status': 'ok', 'queue_depth': self.batcher.queue_depth(),
+                         'stats': self.batcher.stats}, {}
+        if path == '/metrics':
+            return 200, tracing.render_prometheus(), {}
+        if path != '/score':
+            return 404, {'error': 'not found'}, {}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}, {}
+        
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return 400, {'error': 'invalid Content-Length'}, {}
+        if length > self.max_body_bytes:
+            return 413, {'error': f'body larger than {self.max_body_bytes} bytes'}, {}
+        try:
+            request = json.loads(await reader.readexactly(length))
+            article_text = request['article']
+            synopsis_text = request['synopsis']
+        except (asyncio.IncompleteReadError, ValueError, KeyError, TypeError):
+            return 400, {'error': 'expected JSON with article and synopsis'}, {}
+        if not all(isinstance(text, str) and text.strip() for text in (article_text, synopsis_text)):
+            return 400, {'error': 'article and synopsis must be non-empty text'}, {}
+        
+        try:
+            evaluation = await self.score(article_text, synopsis_text, request.get('anonymize', True))
+        except QueueFullError as e:
+            return 503, {'error': str(e)}, {'Retry-After': '1'}
+        except ValueError as e:
+            return 400, {'error': str(e)}, {}
+        return 200, evaluation, {}
+
+async def serve(host, port, batcher):
+    service = ScoringService(batcher)
+    server = await asyncio.start_server(service.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Scoring service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asynchronous synopsis scoring service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--max-batch-size', type=int, default=64, help="Texts per forward pass")
+    parser.add_argument('--max-wait-ms', type=float, default=10, help="Longest a request waits for a batch to fill")
+    parser.add_argument('--max-queue-depth', type=int, default=2048, help="Queued texts before returning 503")
+    parser.add_argument('--trace', action='store_true', help="Record per-stage metrics for /metrics")
+    args = parser.parse_args(argv)
+    
+    if args.trace:
+        tracing.enable_tracing()
+    
+    ensure_nltk_data()
+    tokenizer, model = load_embedding_model()
+    batcher = MicroBatcher(tokenizer, model, max_batch_size=args.max_batch_size,
+                           max_wait_ms=args.max_wait_ms, max_queue_depth=args.max_queue_depth)
+    try:
+        asyncio.run(serve(args.host, args.port, batcher))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        batcher.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import torch
+
+from utils.document import as_document, document_text
+
+from utils.embeddings import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNKING,
+    MAX_MODEL_TOKENS,
+    get_batch_embeddings,
+    get_embeddings,
+    model_identifier,
+    split_article,
+)
+
+class ArticleIndex:
+    """
+    Everything about an article that scoring needs, computed once:
+    sentences, chunks, the chunk embedding matrix and the word count.
+    Scoring another synopsis against it costs one synopsis embedding
+    and one matrix-vector product.
+    """
+
+    def __init__(self, sentences, chunks, chunk_embeddings, word_count, model_name):
+        self.sentences = sentences
+        self.chunks = chunks
+        self.chunk_embeddings = chunk_embeddings
+        self.word_count = word_count
+        self.model_name = model_name
+
+    @classmethod
+    def build(cls, article, tokenizer, model, batch_size=DEFAULT_BATCH_SIZE,
+              chunking=DEFAULT_CHUNKING, max_tokens=MAX_MODEL_TOKENS, overlap=0, max_windows=None, cache=None):
+        """Split, chunk and embed an article, given as text or a ParsedDocument
+        (chunking options as in split_article). If a cache is given, chunks
+        embedded before are served from it."""
+        article = as_document(article)
+        chunks, token_ids = split_article(article, tokenizer, chunking, max_tokens=max_tokens,
+                                          overlap=overlap, max_windows=max_windows)
+        chunk_embeddings = get_batch_embeddings(chunks, tokenizer, model, batch_size=batch_size, cache=cache,
+                                                token_ids=token_ids)
+        return cls(article.sentences, chunks, chunk_embeddings, article.word_count, model_identifier(model))
+
+    def chunk_similarities(self, synopsis, tokenizer, model, synopsis_embedding=None):
+        """
+        Return per-chunk similarities and their average for one synopsis.
+        synopsis_embedding may pass the synopsis's embedding if the caller already has it.
+        """
+        if model_identifier(model) != self.model_name:
+            raise ValueError(f"ArticleIndex was built with {self.model_name}, not {model_identifier(model)}")
+        
+        if synopsis_embedding is None:
+            synopsis_embedding = get_embeddings(document_text(synopsis), tokenizer, model)
+        chunk_similarities = (self.chunk_embeddings @ synopsis_embedding).tolist()
+        return chunk_similarities, sum(chunk_similarities) / len(chunk_similarities)
+
+    def save(self, path):
+        """Serialize the index to disk"""
+        torch.save({
+            'sentences': self.sentences,
+            'chunks': self.chunks,
+            'chunk_embeddings': self.chunk_embeddings,
+            'word_count': self.word_count,
+            'model_name': self.model_name,
+        }, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        data = torch.load(path, weights_only=True)
+        return cls(data['sentences'], data['chunks'], data['chunk_embeddings'],
+                   data['word_count'], data['model_name'])
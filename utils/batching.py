@@ -0,0 +1,113 @@
+import asyncio
+import queue
+import threading
+import time
+
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import get_batch_embeddings
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at its depth limit"""
+
+class MicroBatcher:
+    """
+    Collect embedding requests from concurrent callers into micro-batches and run
+    them on one dedicated inference thread. A batch is dispatched once it holds
+    max_batch_size texts or the oldest request has waited max_wait_ms.
+    """
+
+    def __init__(self, tokenizer, model, max_batch_size=64, max_wait_ms=10, max_queue_depth=2048):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        self.queue = queue.Queue()
+        self.depth = 0  # Texts queued or being embedded
+        self.depth_lock = threading.Lock()
+        self.stats = {'batches': 0, 'texts': 0, 'rejected': 0}
+        self.thread = threading.Thread(target=self._run, name="inference", daemon=True)
+        self.thread.start()
+
+    def queue_depth(self):
+        with self.depth_lock:
+            return self.depth
+
+    async def embed(self, texts, token_ids=None):
+        """
+        Embed texts, returning a (len(texts), dim) tensor; raises QueueFullError under overload.
+        token_ids may supply input ids per text, as for get_batch_embeddings.
+        """
+        with self.depth_lock:
+            if self.depth + len(texts) > self.max_queue_depth:
+                self.stats['rejected'] += 1
+                raise QueueFullError(f"Inference queue is full ({self.depth} texts waiting)")
+            self.depth += len(texts)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue.put((texts, token_ids, future, loop))
+        return await future
+
+    def close(self):
+        """Stop the inference thread after the queued work is done"""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self, first):
+        """Gather requests until the batch is full or the wait budget is spent"""
+        batch = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # Let the main loop see the stop signal
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = self._collect(item)
+            texts = [text for request_texts, _, _, _ in batch for text in request_texts]
+            token_ids = [ids for request_texts, request_ids, _, _ in batch
+                         for ids in (request_ids or [None] * len(request_texts))]
+            
+            try:
+                embeddings = get_batch_embeddings(texts, self.tokenizer, self.model,
+                                                  batch_size=self.max_batch_size, cache=get_embedding_cache(),
+                                                  token_ids=token_ids)
+                error = None
+            except Exception as e:
+                error = e
+            
+            with self.depth_lock:
+                self.depth -= len(texts)
+            self.stats['batches'] += 1
+            self.stats['texts'] += len(texts)
+            
+            offset = 0
+            for request_texts, _, future, loop in batch:
+                result = None if error else embeddings[offset:offset + len(request_texts)]
+                offset += len(request_texts)
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+
+def _resolve(future, result, error):
+    """Complete a caller's future on its own event loop"""
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
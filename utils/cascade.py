@@ -0,0 +1,145 @@
+import math
+import re
+from collections import Counter
+
+from utils.document import as_document, chunk_sentences
+from utils.evaluator import score_synopsis
+from utils.tracing import traced
+
+# Final-score band in which the lexical estimate is not trusted and MiniLM decides
+UNCERTAIN_BAND = (30.0, 70.0)
+
+# Map a TF-IDF cosine c onto the MiniLM similarity scale as BASE + SCALE * sqrt(c);
+# lexical overlap with a single chunk is sparse, so small cosines matter most
+# (refit with benchmarks/cascade_calibration.py)
+LEXICAL_BASE = 0.1
+LEXICAL_SCALE = 1.0
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same she should so some such than
+that the their theirs them themselves then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+def _terms(text):
+    return [word for word in _WORD_PATTERN.findall(text.lower()) if word not in _STOPWORDS]
+
+def _bigrams(terms):
+    return set(zip(terms, terms[1:]))
+
+def _tfidf_vector(terms, idf, default_idf):
+    """L2-normalised TF-IDF weights as a dict"""
+    vector = {term: count * idf.get(term, default_idf) for term, count in Counter(terms).items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+def _cosine(vector, other):
+    if len(other) < len(vector):
+        vector, other = other, vector
+    return sum(weight * other.get(term, 0.0) for term, weight in vector.items())
+
+class LexicalIndex:
+    """
+    The cheap first tier of cascade scoring: TF-IDF vectors and unigram/bigram
+    sets for about as many article chunks as the model tier embeds (sentence chunks,
+    since token windows need the tokenizer). Built once per article, no model needed.
+    """
+
+    def __init__(self, chunk_vectors, article_vector, idf, default_idf, unigrams, bigrams, word_count):
+        self.chunk_vectors = chunk_vectors
+        self.article_vector = article_vector
+        self.idf = idf
+        self.default_idf = default_idf
+        self.unigrams = unigrams
+        self.bigrams = bigrams
+        self.word_count = word_count
+
+    @classmethod
+    def build(cls, article):
+        """Index an article given as text or a ParsedDocument"""
+        article = as_document(article)
+        chunk_terms = [_terms(chunk) for chunk in chunk_sentences(article.sentences)]
+        
+        # Smoothed IDF over chunks; terms the article never uses get the highest weight
+        document_frequency = Counter(term for terms in chunk_terms for term in set(terms))
+        n = len(chunk_terms)
+        idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        default_idf = math.log(1 + n) + 1
+        
+        all_terms = [term for terms in chunk_terms for term in terms]
+        return cls(
+            [_tfidf_vector(terms, idf, default_idf) for terms in chunk_terms],
+            _tfidf_vector(all_terms, idf, default_idf),
+            idf, default_idf,
+            set(all_terms),
+            set().union(*(_bigrams(terms) for terms in chunk_terms)),
+            article.word_count,
+        )
+
+    def signals(self, synopsis):
+        """Per-chunk TF-IDF cosines plus whole-article cosine and unigram/bigram overlap"""
+        terms = _terms(as_document(synopsis).text)
+        vector = _tfidf_vector(terms, self.idf, self.default_idf)
+        chunk_cosines = [_cosine(vector, chunk_vector) for chunk_vector in self.chunk_vectors]
+        
+        unigrams = set(terms)
+        bigrams = _bigrams(terms)
+        return chunk_cosines, {
+            'tfidf_cosine': _cosine(vector, self.article_vector),
+            'unigram_overlap': len(unigrams & self.unigrams) / len(unigrams) if unigrams else 0.0,
+            'bigram_overlap': len(bigrams & self.bigrams) / len(bigrams) if bigrams else 0.0,
+        }
+
+    @traced("lexical_tier")
+    def evaluate(self, synopsis):
+        """
+        Estimate the full evaluation without the model: chunk cosines are mapped
+        onto the similarity scale, while length and clarity are computed exactly.
+        """
+        synopsis = as_document(synopsis)
+        chunk_cosines, signals = self.signals(synopsis)
+        estimated = [lexical_similarity(cosine) for cosine in chunk_cosines]
+        
+        evaluation = score_synopsis(estimated, sum(estimated) / len(estimated), self.word_count, synopsis)
+        evaluation['lexical_signals'] = {name: round(value, 3) for name, value in signals.items()}
+        return evaluation
+
+def lexical_similarity(cosine):
+    """Estimated MiniLM similarity for a TF-IDF cosine"""
+    return min(1.0, LEXICAL_BASE + LEXICAL_SCALE * math.sqrt(max(0.0, cosine)))
+
+def needs_model(lexical_evaluation, uncertain_band=UNCERTAIN_BAND):
+    """Whether a lexical estimate is too close to call and MiniLM should score it"""
+    if lexical_evaluation['lexical_signals']['unigram_overlap'] == 0:
+        return False  # Shares no content words with the article: plainly off-target or empty
+    low, high = uncertain_band
+    return low <= lexical_evaluation['final_score'] <= high
+
+def evaluate_synopsis_cascade(article, synopsis, score_with_model, full_precision=False,
+                              uncertain_band=UNCERTAIN_BAND, lexical_index=None):
+    """
+    Score with the lexical tier first and call score_with_model() (which loads the
+    model on demand and returns a full evaluation) only when the estimate falls in
+    uncertain_band or full_precision is requested.
+    The result records the producing 'tier' ("lexical" or "model"), the lexical
+    estimate and its signals.
+    """
+    synopsis = as_document(synopsis)
+    if lexical_index is None:
+        lexical_index = LexicalIndex.build(article)
+    estimate = lexical_index.evaluate(synopsis)
+    
+    if not full_precision and not needs_model(estimate, uncertain_band):
+        estimate['tier'] = 'lexical'
+        estimate['lexical_estimate'] = estimate['final_score']
+        return estimate
+    
+    evaluation = dict(score_with_model())
+    evaluation['tier'] = 'model'
+    evaluation['lexical_estimate'] = estimate['final_score']
+    evaluation['lexical_signals'] = estimate['lexical_signals']
+    return evaluation
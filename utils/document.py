@@ -0,0 +1,83 @@
+import functools
+from array import array
+
+@functools.lru_cache(maxsize=1)
+def _punkt_tokenizer():
+    """The Punkt model behind nltk's sent_tokenize, loaded once"""
+    import nltk
+    return nltk.data.load('tokenizers/punkt/english.pickle')
+
+class ParsedDocument:
+    """
+    A text parsed once and shared by every pipeline stage.
+    Sentences are stored as (start, end) offsets into the one text buffer and
+    tokenizer ids as flat arrays, so nothing is re-split or re-tokenized.
+    """
+
+    __slots__ = ('text', 'sentence_starts', 'sentence_ends', 'word_count', '_sentence_word_counts', '_token_ids')
+
+    def __init__(self, text, sentence_spans=None):
+        self.text = text
+        if sentence_spans is None:
+            # Same boundaries as sent_tokenize(text)
+            sentence_spans = _punkt_tokenizer().span_tokenize(text) if text else []
+        self.sentence_starts = array('I')
+        self.sentence_ends = array('I')
+        for start, end in sentence_spans:
+            self.sentence_starts.append(start)
+            self.sentence_ends.append(end)
+        self.word_count = len(text.split())
+        self._sentence_word_counts = None
+        self._token_ids = {}  # tokenizer name -> (offsets, flat ids)
+
+    @property
+    def sentence_count(self):
+        return len(self.sentence_starts)
+
+    def sentence(self, index):
+        return self.text[self.sentence_starts[index]:self.sentence_ends[index]]
+
+    @property
+    def sentences(self):
+        """Sentence strings, as sent_tokenize would return them"""
+        text = self.text
+        return [text[start:end] for start, end in zip(self.sentence_starts, self.sentence_ends)]
+
+    def sentence_word_counts(self):
+        """Words per sentence, computed once"""
+        if self._sentence_word_counts is None:
+            self._sentence_word_counts = array('I', (len(sentence.split()) for sentence in self.sentences))
+        return self._sentence_word_counts
+
+    def sentence_token_ids(self, tokenizer):
+        """Token ids of every sentence (without special tokens), tokenized once per tokenizer"""
+        key = getattr(tokenizer, 'name_or_path', None) or id(tokenizer)
+        if key not in self._token_ids:
+            encoded = tokenizer(self.sentences, add_special_tokens=False)["input_ids"] if self.sentence_count else []
+            offsets = array('I', [0])
+            flat = array('i')
+            for ids in encoded:
+                flat.extend(ids)
+                offsets.append(len(flat))
+            self._token_ids[key] = (offsets, flat)
+        
+        offsets, flat = self._token_ids[key]
+        return [flat[offsets[i]:offsets[i + 1]].tolist() for i in range(len(offsets) - 1)]
+
+def as_document(text_or_document):
+    """Accept either raw text or a ParsedDocument"""
+    if isinstance(text_or_document, ParsedDocument):
+        return text_or_document
+    return ParsedDocument(text_or_document)
+
+def document_text(text_or_document):
+    """The raw text of either raw text or a ParsedDocument"""
+    if isinstance(text_or_document, ParsedDocument):
+        return text_or_document.text
+    return text_or_document
+
+def chunk_sentences(article_sentences):
+    """Group sentences into roughly 10 chunks of equal size"""
+    chunk_size = max(1, len(article_sentences) // 10)  # Aim for about 10 chunks
+    return [' '.join(article_sentences[i:i+chunk_size]) 
+            for i in range(0, len(article_sentences), chunk_size)]
@@ -0,0 +1,143 @@
+import re
+import zlib
+
+import numpy as np
+import torch
+
+# Synopses at or above this cosine similarity are flagged as suspected duplicates
+DEFAULT_THRESHOLD = 0.95
+# Rows of the similarity matrix computed at a time: memory is block_size x n floats
+DEFAULT_BLOCK_SIZE = 1024
+# Most similar neighbours kept per synopsis before thresholding
+DEFAULT_TOP_K = 10
+
+# MinHash/LSH prefilter: word shingles, signature length and bands (rows per band = perms / bands)
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+_MERSENNE_PRIME = (1 << 31) - 1
+
+def find_similar_pairs(embeddings, threshold=DEFAULT_THRESHOLD, block_size=DEFAULT_BLOCK_SIZE, top_k=DEFAULT_TOP_K):
+    """
+    All pairs (i, j, similarity) with i < j and cosine similarity >= threshold,
+    from a (n, dim) matrix of L2-normalised embeddings.
+    The upper triangle is computed one block of rows at a time, and only each
+    row's top_k neighbours are kept, so memory stays at block_size x n floats.
+    """
+    n = embeddings.shape[0]
+    pairs = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        # Columns before `start` were already compared against these rows
+        sims = embeddings[start:stop] @ embeddings[start:].T
+        rows = torch.arange(stop - start).unsqueeze(1)
+        sims[torch.arange(n - start).unsqueeze(0) <= rows] = -1.0  # Diagonal and lower triangle
+        
+        k = min(top_k, n - start)
+        values, columns = sims.topk(k, dim=1)
+        for row, column in (values >= threshold).nonzero().tolist():
+            pairs.append((start + row, start + columns[row, column].item(), values[row, column].item()))
+    return pairs
+
+def _shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < shingle_size:
+        words = words + [''] * (shingle_size - len(words))
+    shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) & _MERSENNE_PRIME for s in shingles),
+                       dtype=np.uint64, count=len(shingles))
+
+def minhash_signatures(texts, num_permutations=NUM_PERMUTATIONS, shingle_size=SHINGLE_SIZE, seed=0):
+    """(len(texts), num_permutations) MinHash signatures over word shingles"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    
+    signatures = np.empty((len(texts), num_permutations), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = _shingle_hashes(text, shingle_size)
+        # Both factors are below 2**31, so the products fit in 64 bits
+        signatures[i] = ((np.outer(hashes, a) + b) % _MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+def lsh_candidate_pairs(signatures, bands=NUM_BANDS):
+    """
+    Pairs (i, j), i < j, that share at least one band of their MinHash signature.
+    With 16 bands of 4 rows, pairs of Jaccard similarity around 0.5 and above are
+    very likely to become candidates.
+    """
+    rows_per_band = signatures.shape[1] // bands
+    candidates = set()
+    for band in range(bands):
+        buckets = {}
+        chunk = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        for i in range(chunk.shape[0]):
+            buckets.setdefault(chunk[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    candidates.add((members[x], members[y]))
+    return candidates
+
+class DisjointSet:
+    """Union-find over 0..n-1 with path halving and union by size"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return
+        if self.size[x] < self.size[y]:
+            x, y = y, x
+        self.parent[y] = x
+        self.size[x] += self.size[y]
+
+def cluster_pairs(n, pairs):
+    """Group indices connected by any pair; returns clusters of two or more, largest first"""
+    components = DisjointSet(n)
+    for i, j, _ in pairs:
+        components.union(i, j)
+    clusters = {}
+    for i, j, _ in pairs:
+        for member in (i, j):
+            clusters.setdefault(components.find(member), set()).add(member)
+    return sorted((sorted(members) for members in clusters.values()), key=lambda c: (-len(c), c[0]))
+
+def find_duplicates(ids, texts, embeddings, threshold=DEFAULT_THRESHOLD, block_size=DEFAULT_BLOCK_SIZE,
+                    top_k=DEFAULT_TOP_K, use_lsh=False, signatures=None):
+    """
+    Suspected duplicate synopses in a cohort.
+    Embedding pairs come from the blocked top-k search; with use_lsh, only pairs
+    proposed by MinHash/LSH over text shingles are compared instead, which finds
+    copied text without the n x n product but misses heavy paraphrases.
+    signatures may pass MinHash signatures computed earlier, in which case texts is not needed.
+    Returns {'pairs': [{'a', 'b', 'similarity'}], 'clusters': [[id, ...]]}.
+    """
+    if use_lsh:
+        if signatures is None:
+            signatures = minhash_signatures(texts)
+        candidates = sorted(lsh_candidate_pairs(signatures))
+        pairs = []
+        if candidates:
+            left = torch.tensor([i for i, _ in candidates])
+            right = torch.tensor([j for _, j in candidates])
+            sims = (embeddings[left] * embeddings[right]).sum(dim=1).tolist()
+            pairs = [(i, j, sim) for (i, j), sim in zip(candidates, sims) if sim >= threshold]
+    else:
+        pairs = find_similar_pairs(embeddings, threshold=threshold, block_size=block_size, top_k=top_k)
+    
+    pairs.sort(key=lambda pair: -pair[2])
+    return {
+        'threshold': threshold,
+        'pairs': [{'a': ids[i], 'b': ids[j], 'similarity': round(sim, 4)} for i, j, sim in pairs],
+        'clusters': [[ids[i] for i in cluster] for cluster in cluster_pairs(len(ids), pairs)],
+    }
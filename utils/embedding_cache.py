@@ -0,0 +1,284 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+def cache_key(model_name, text):
+    """Content-address a chunk by model name and whitespace-normalized text"""
+    normalized = re.sub(r'\s+', ' ', text).strip()
+    return hashlib.sha256(f"{model_name}\0{normalized}".encode('utf-8')).hexdigest()
+
+# Width of the key digest stored next to every row
+KEY_BYTES = 32
+
+def _lock_slot(cache_dir):
+    """
+    Lock the first free store directory under cache_dir for this process's lifetime:
+    cache_dir itself, then cache_dir/process-1, process-2, ... Each process gets a
+    store of its own (rows are allocated in memory, so two writers would reuse the
+    same rows), and a restarted process picks its slot up again.
+    Returns (directory, open lock file); the lock is None where fcntl is unavailable.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return cache_dir, None
+    
+    slot = 0
+    while True:
+        directory = cache_dir if slot == 0 else os.path.join(cache_dir, f"process-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, 'lock'), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return directory, lock
+        except OSError:
+            lock.close()
+            slot += 1
+
+class DiskEmbeddingStore:
+    """
+    On-disk embedding tier: a memory-mapped float32 matrix with one row per entry,
+    the digest of each row's key alongside it, and a JSON index mapping keys to
+    rows in least-recently-used order.
+    The index is written in batches, so after a crash it can point at a row that
+    has since been reused for another key; reads check the stored digest and treat
+    a mismatch as a miss.
+    """
+
+    def __init__(self, cache_dir, max_entries=100000):
+        self.cache_dir, self.lock = _lock_slot(cache_dir)
+        self.max_entries = max_entries
+        self.matrix_path = os.path.join(self.cache_dir, 'embeddings.f32')
+        self.keys_path = os.path.join(self.cache_dir, 'keys.bin')
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self.index = OrderedDict()  # key -> row, oldest first
+        self.free_rows = []
+        self.dim = None
+        self.matrix = None
+        self.keys = None
+        self.dirty = 0
+        self._load()
+
+    def _load(self):
+        """Reopen an existing cache directory, discarding it if it is inconsistent"""
+        if not all(os.path.exists(path) for path in (self.index_path, self.matrix_path, self.keys_path)):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['max_entries'] != self.max_entries:
+                return  # Capacity changed; start over rather than remap rows
+            self.dim = meta['dim']
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+',
+                                    shape=(self.max_entries, self.dim))
+            self.keys = np.memmap(self.keys_path, dtype=np.uint8, mode='r+',
+                                  shape=(self.max_entries, KEY_BYTES))
+            # Keep only entries whose row still holds their key
+            self.index = OrderedDict((key, row) for key, row in meta['entries']
+                                     if self.keys[row].tobytes() == bytes.fromhex(key))
+            used = set(self.index.values())
+            self.free_rows = [row for row in range(self.max_entries - 1, -1, -1) if row not in used]
+        except (OSError, ValueError, KeyError, IndexError):
+            self.index = OrderedDict()
+            self.dim = None
+            self.matrix = None
+            self.keys = None
+
+    def _open_matrix(self, dim):
+        self.dim = dim
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='w+',
+                                shape=(self.max_entries, dim))
+        self.keys = np.memmap(self.keys_path, dtype=np.uint8, mode='w+',
+                              shape=(self.max_entries, KEY_BYTES))
+        self.free_rows = list(range(self.max_entries - 1, -1, -1))
+
+    def get(self, key):
+        row = self.index.get(key)
+        if row is None:
+            return None
+        if self.keys[row].tobytes() != bytes.fromhex(key):
+            # Stale index entry: the row was reused before the index was saved
+            del self.index[key]
+            return None
+        self.index.move_to_end(key)
+        return torch.from_numpy(np.array(self.matrix[row]))
+
+    def put(self, key, embedding):
+        """Store an embedding, evicting the least recently used row when full"""
+        vector = embedding.detach().cpu().numpy().astype(np.float32)
+        if self.matrix is None:
+            self._open_matrix(vector.shape[-1])
+        if vector.shape[-1] != self.dim:
+            return 0
+        
+        evicted = 0
+        if key in self.index:
+            row = self.index[key]
+            self.index.move_to_end(key)
+        else:
+            if not self.free_rows:
+                _, row = self.index.popitem(last=False)
+                evicted = 1
+            else:
+                row = self.free_rows.pop()
+            self.index[key] = row
+        # Invalidate the row before overwriting it, so a crash mid-write reads as a miss
+        self.keys[row] = 0
+        self.matrix[row] = vector
+        self.keys[row] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+        
+        self.dirty += 1
+        if self.dirty >= 256:
+            self.flush()
+        return evicted
+
+    def flush(self):
+        """Persist the matrix, the key digests and the index"""
+        if self.matrix is None:
+            return
+        self.matrix.flush()
+        self.keys.flush()
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'max_entries': self.max_entries,
+                       'entries': list(self.index.items())}, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = 0
+
+    def discard(self, key):
+        """Forget one entry and free its row"""
+        row = self.index.pop(key, None)
+        if row is None:
+            return
+        self.keys[row] = 0
+        self.free_rows.append(row)
+        self.dirty += 1
+
+    def __len__(self):
+        return len(self.index)
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by a hash of (model name, normalized text).
+    The in-process tier is an LRU dict; the optional disk tier survives restarts.
+    """
+
+    def __init__(self, max_entries=4096, cache_dir=None, disk_max_entries=100000):
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.disk = DiskEmbeddingStore(cache_dir, disk_max_entries) if cache_dir else None
+        self.lock = threading.Lock()
+        self.local = threading.local()  # Per-thread set collecting the keys of new entries, see recording()
+        self.counters = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _remember(self, key, embedding):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def get(self, model_name, text):
+        """Return the cached embedding for text, or None on a miss"""
+        key = cache_key(model_name, text)
+        with self.lock:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                self.memory.move_to_end(key)
+                self.counters['hits'] += 1
+                self.counters['memory_hits'] += 1
+                return embedding
+            
+            if self.disk is not None:
+                embedding = self.disk.get(key)
+                if embedding is not None:
+                    self._remember(key, embedding)
+                    self.counters['hits'] += 1
+                    self.counters['disk_hits'] += 1
+                    return embedding
+            
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, model_name, text, embedding):
+        """Store an embedding in both tiers"""
+        key = cache_key(model_name, text)
+        embedding = embedding.detach().clone()
+        recorded = getattr(self.local, 'recorded', None)
+        with self.lock:
+            if recorded is not None and key not in self.memory and (self.disk is None or key not in self.disk.index):
+                recorded.add(key)
+            self._remember(key, embedding)
+            if self.disk is not None:
+                self.counters['evictions'] += self.disk.put(key, embedding)
+
+    @contextlib.contextmanager
+    def recording(self, keys):
+        """
+        Add the key of every new entry this thread stores inside the block to the
+        set keys, so whoever caused them can evict() just those later.
+        """
+        previous = getattr(self.local, 'recorded', None)
+        self.local.recorded = keys
+        try:
+            yield keys
+        finally:
+            self.local.recorded = previous
+
+    def evict(self, keys):
+        """Drop the given entries from both tiers"""
+        with self.lock:
+            for key in keys:
+                self.memory.pop(key, None)
+                if self.disk is not None:
+                    self.disk.discard(key)
+
+    def flush(self):
+        with self.lock:
+            if self.disk is not None:
+                self.disk.flush()
+
+    def clear(self):
+        """Drop the in-process tier and reset counters (the disk tier is kept)"""
+        with self.lock:
+            self.memory.clear()
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def stats(self):
+        """Hit/miss counters and tier sizes, for sizing the cache"""
+        with self.lock:
+            stats = dict(self.counters)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            stats['memory_entries'] = len(self.memory)
+            stats['disk_entries'] = len(self.disk) if self.disk is not None else 0
+            return stats
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """
+    Return the process-wide cache used by compute_chunk_similarities.
+    The disk tier is enabled by setting SYNOPSIS_EMBEDDING_CACHE_DIR.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(
+                max_entries=int(os.environ.get('SYNOPSIS_EMBEDDING_CACHE_SIZE', 4096)),
+                cache_dir=os.environ.get('SYNOPSIS_EMBEDDING_CACHE_DIR') or None,
+                disk_max_entries=int(os.environ.get('SYNOPSIS_EMBEDDING_CACHE_DISK_SIZE', 100000)),
+            )
+            if _default_cache.disk is not None:
+                import atexit
+                atexit.register(_default_cache.flush)
+        return _default_cache
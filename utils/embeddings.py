@@ -1,64 +1,328 @@
+import os
 import torch
 import torch.nn.functional as F
 from transformers import AutoTokenizer, AutoModel
-from nltk.tokenize import sent_tokenize
+from transformers.modeling_outputs import BaseModelOutput
 import streamlit as st
+from utils import tracing
+from utils.document import as_document, chunk_sentences, document_text
+from utils.embedding_cache import get_embedding_cache
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Inference backends accepted by load_embedding_model
+BACKENDS = ("fp32", "int8", "torchscript")
+
+# MiniLM's maximum sequence length, including special tokens
+MAX_MODEL_TOKENS = 512
+
+# Upper bound on texts per forward pass so memory stays bounded on long articles
+DEFAULT_BATCH_SIZE = 32
+
+# Article chunking unless a caller asks otherwise: token windows fit the model, so no
+# article text is cut off at MAX_MODEL_TOKENS; short articles still form about TARGET_CHUNKS
+DEFAULT_CHUNKING = "tokens"
+TARGET_CHUNKS = 10
+
+class TracedEncoder(torch.nn.Module):
+    """Wrap a TorchScript-traced encoder so it is called like the Hugging Face model"""
+
+    def __init__(self, traced, config):
+        super().__init__()
+        self.traced = traced
+        self.config = config
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_ids)
+        outputs = self.traced(input_ids, attention_mask, token_type_ids)
+        return BaseModelOutput(last_hidden_state=outputs[0])
 
 @st.cache_resource
-def load_embedding_model():
-    """Load the model and tokenizer for embeddings"""
-    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-    model = AutoModel.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+@tracing.traced("model_load")
+def load_embedding_model(backend=None, model_path=None, num_threads=None, shared_weights_dir=None):
+    """
+    Load the model and tokenizer for embeddings.
+    backend is one of BACKENDS (default: SYNOPSIS_BACKEND or "fp32"):
+      fp32        - the model as published
+      int8        - dynamic int8 quantization of the Linear layers (CPU)
+      torchscript - a traced TorchScript graph
+    model_path may be a hub name or a local directory (default: SYNOPSIS_MODEL_PATH or MODEL_NAME);
+    local directories are loaded without network access.
+    num_threads sets torch's intra-op thread count (default: SYNOPSIS_NUM_THREADS, else torch's default).
+    shared_weights_dir (default: SYNOPSIS_SHARED_WEIGHTS_DIR) memory-maps fp32 weights from a file
+    written once per node, so server processes share one copy (see utils/shared_weights.py);
+    model.memory_report then holds this process's resident memory before and after loading.
+    """
+    backend = backend or os.environ.get("SYNOPSIS_BACKEND", "fp32")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    model_path = model_path or os.environ.get("SYNOPSIS_MODEL_PATH") or MODEL_NAME
+    local_only = os.path.isdir(model_path)
+    shared_weights_dir = shared_weights_dir or os.environ.get("SYNOPSIS_SHARED_WEIGHTS_DIR")
+    if shared_weights_dir and backend != "fp32":
+        raise ValueError(f"Shared weights require the fp32 backend; {backend!r} builds its own copy of the weights")
+    
+    num_threads = num_threads or os.environ.get("SYNOPSIS_NUM_THREADS")
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    
+    tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=local_only)
+    if shared_weights_dir:
+        from utils.shared_weights import load_shared_model
+        model = load_shared_model(model_path, shared_weights_dir, local_only=local_only)
+    else:
+        model = AutoModel.from_pretrained(model_path, local_files_only=local_only,
+                                          torchscript=(backend == "torchscript"))
+    model.eval()
+    
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == "torchscript":
+        example = tokenizer("Warm-up sentence for tracing.", return_tensors="pt")
+        with torch.no_grad():
+            traced = torch.jit.trace(model, (example["input_ids"], example["attention_mask"],
+                                             example["token_type_ids"]), strict=False)
+        model = TracedEncoder(torch.jit.freeze(traced.eval()), model.config)
+    
+    # Embeddings from different backends differ slightly, so they are cached separately
+    model.embedding_backend = backend
     return tokenizer, model
 
+def _embedding_dim(model):
+    """Return the embedding dimension of the model (384 for all-MiniLM-L6-v2)"""
+    config = getattr(model, "config", None)
+    return getattr(config, "hidden_size", 384)
+
+def model_identifier(model):
+    """Name used to key cached embeddings for this model"""
+    config = getattr(model, "config", None)
+    name = getattr(config, "_name_or_path", None) or MODEL_NAME
+    backend = getattr(model, "embedding_backend", "fp32")
+    return name if backend == "fp32" else f"{name}:{backend}"
+
+def _mean_pool(token_embeddings, attention_mask):
+    """Average token embeddings, ignoring padding positions"""
+    input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
+    sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1)
+    sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
+    return sum_embeddings / sum_mask
+
 def get_embeddings(text, tokenizer, model):
     """Generate embeddings for the given text"""
     # Handle empty or very short texts
     if not text or len(text.strip()) < 5:
-        # Return a zero vector of the expected dimension (384 for all-MiniLM-L6-v2)
-        return torch.zeros(384)
+        # Return a zero vector of the expected dimension
+        return torch.zeros(_embedding_dim(model))
     
     # Tokenize and get model outputs
-    inputs = tokenizer(text, padding=True, truncation=True, return_tensors="pt", max_length=512)
+    inputs = tokenizer(text, padding=True, truncation=True, return_tensors="pt", max_length=MAX_MODEL_TOKENS)
     with torch.no_grad():
         outputs = model(**inputs)
     
     # Mean pooling
-    attention_mask = inputs["attention_mask"]
-    token_embeddings = outputs.last_hidden_state
-    input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-    sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1)
-    sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
-    embeddings = sum_embeddings / sum_mask
+    embeddings = _mean_pool(outputs.last_hidden_state, inputs["attention_mask"])
     
     # Normalize embeddings
     embeddings = F.normalize(embeddings, p=2, dim=1)
     
     return embeddings.squeeze()
 
+@tracing.traced("embed")
+def get_batch_embeddings(texts, tokenizer, model, batch_size=DEFAULT_BATCH_SIZE, cache=None, token_ids=None):
+    """
+    Generate embeddings for a list of texts in as few forward passes as possible.
+    Returns a (len(texts), dim) tensor whose rows match get_embeddings for each text.
+    If a cache is given, previously embedded texts are served from it.
+    token_ids may supply already-tokenized input ids (with special tokens) per text;
+    entries left as None are tokenized here.
+    """
+    embeddings = torch.zeros(len(texts), _embedding_dim(model))
+    
+    # Empty or very short texts keep their zero vector, as in get_embeddings
+    valid = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 5]
+    
+    if cache is not None:
+        model_name = model_identifier(model)
+        missing = []
+        for i in valid:
+            cached = cache.get(model_name, texts[i])
+            if cached is None:
+                missing.append(i)
+            else:
+                embeddings[i] = cached
+        valid = missing
+    
+    if not valid:
+        return embeddings
+    
+    # Tokenize everything that was not pre-tokenized once, without padding
+    input_ids = {i: token_ids[i] for i in valid if token_ids is not None and token_ids[i] is not None}
+    to_tokenize = [i for i in valid if i not in input_ids]
+    if to_tokenize:
+        encoded = tokenizer([texts[i] for i in to_tokenize], truncation=True, max_length=MAX_MODEL_TOKENS)
+        input_ids.update(zip(to_tokenize, encoded["input_ids"]))
+    
+    # Sort by token length so each batch holds similarly sized texts (less padding)
+    order = sorted(valid, key=lambda i: len(input_ids[i]))
+    if tracing.is_enabled():
+        tracing.add_tokens(sum(len(input_ids[i]) for i in valid))
+    
+    with torch.no_grad():
+        for start in range(0, len(order), max(1, batch_size)):
+            bucket = order[start:start + max(1, batch_size)]
+            inputs = tokenizer.pad({"input_ids": [input_ids[i] for i in bucket]},
+                                   padding=True, return_tensors="pt")
+            outputs = model(**inputs)
+            
+            pooled = _mean_pool(outputs.last_hidden_state, inputs["attention_mask"])
+            embeddings[bucket] = F.normalize(pooled, p=2, dim=1)
+    
+    if cache is not None:
+        for i in valid:
+            cache.put(model_name, texts[i], embeddings[i])
+    
+    return embeddings
+
 def compute_similarity(embedding1, embedding2):
     """Compute cosine similarity between two embeddings"""
     return F.cosine_similarity(embedding1.unsqueeze(0), embedding2.unsqueeze(0)).item()
 
-def compute_chunk_similarities(article_text, synopsis_text, tokenizer, model):
+def split_article_chunks(article):
+    """Split the article (text or ParsedDocument) into roughly 10 chunks of whole sentences"""
+    return chunk_sentences(as_document(article).sentences)
+
+def split_token_windows(article_sentences, tokenizer, max_tokens=MAX_MODEL_TOKENS, overlap=0, max_windows=None,
+                        sentence_ids=None, min_windows=None):
+    """
+    Pack sentences into windows that fit within max_tokens (including special tokens),
+    so no window is silently truncated by the model. Each sentence is tokenized once.
+    overlap carries up to that many tokens of trailing sentences into the next window.
+    max_windows keeps an evenly spaced subset of windows for latency-sensitive requests.
+    min_windows packs smaller windows when the text is short, so it still splits into
+    about that many (sentences are only ever cut at max_tokens).
+    sentence_ids may pass token ids already computed for the sentences (see ParsedDocument).
+    Returns (window_text, input_ids) pairs, with input_ids ready for the model.
+    """
+    budget = max(1, max_tokens - tokenizer.num_special_tokens_to_add())
+    if not article_sentences:
+        return []
+    if sentence_ids is None:
+        sentence_ids = tokenizer(article_sentences, add_special_tokens=False)["input_ids"]
+    
+    # Sentences longer than the budget are cut into budget-sized pieces
+    pieces = []
+    for sentence, ids in zip(article_sentences, sentence_ids):
+        if len(ids) <= budget:
+            pieces.append((sentence, ids))
+        else:
+            for start in range(0, len(ids), budget):
+                piece_ids = ids[start:start + budget]
+                pieces.append((tokenizer.decode(piece_ids), piece_ids))
+    
+    window_size = budget
+    if min_windows:
+        total = sum(len(ids) for _, ids in pieces)
+        window_size = min(budget, max(1, -(-total // min_windows)))
+    
+    windows = []
+    current = []
+    current_len = 0
+    for piece in pieces:
+        if current and current_len + len(piece[1]) > window_size:
+            windows.append(current)
+            
+            # Start the next window with trailing pieces that fit in the overlap
+            carried = []
+            carried_len = 0
+            for prev in reversed(current):
+                if carried_len + len(prev[1]) > overlap or carried_len + len(prev[1]) + len(piece[1]) > budget:
+                    break
+                carried.insert(0, prev)
+                carried_len += len(prev[1])
+            current, current_len = carried, carried_len
+        
+        current.append(piece)
+        current_len += len(piece[1])
+    if current:
+        windows.append(current)
+    
+    if max_windows and len(windows) > max_windows:
+        if max_windows == 1:
+            windows = [windows[0]]
+        else:
+            step = (len(windows) - 1) / (max_windows - 1)
+            windows = [windows[round(i * step)] for i in range(max_windows)]
+    
+    return [(' '.join(text for text, _ in window),
+             tokenizer.build_inputs_with_special_tokens([t for _, ids in window for t in ids]))
+            for window in windows]
+
+def split_article(article, tokenizer, chunking=DEFAULT_CHUNKING, max_tokens=MAX_MODEL_TOKENS, overlap=0,
+                  max_windows=None):
+    """
+    Article chunks to embed and their input ids (None where the chunk is tokenized as usual).
+    chunking="tokens" packs sentences into about TARGET_CHUNKS windows that fit the model
+    (see split_token_windows); chunking="sentences" forms about 10 equal chunks of
+    sentences, which the model truncates at MAX_MODEL_TOKENS. max_tokens, overlap and
+    max_windows only apply to token windows.
+    """
+    article = as_document(article)
+    if chunking == "tokens":
+        windows = split_token_windows(article.sentences, tokenizer, max_tokens=max_tokens,
+                                      overlap=overlap, max_windows=max_windows,
+                                      sentence_ids=article.sentence_token_ids(tokenizer),
+                                      min_windows=TARGET_CHUNKS)
+        return [text for text, _ in windows], [ids for _, ids in windows]
+    chunks = split_article_chunks(article)
+    return chunks, [None] * len(chunks)
+
+@tracing.traced("similarity_matrix", measure=lambda article, synopsis, *args, **kwargs:
+                len(document_text(article)) + len(document_text(synopsis)))
+def compute_similarity_matrix(article, synopsis, tokenizer, model, batch_size=DEFAULT_BATCH_SIZE, cache=None,
+                              chunking=DEFAULT_CHUNKING):
+    """
+    Embed the whole synopsis, every synopsis sentence and every article chunk in
+    batched passes and return their cosine similarities as one matrix product.
+    Row 0 is the whole synopsis (the values compute_chunk_similarities returns);
+    rows 1.. are the synopsis sentences; columns are the article chunks.
+    """
+    if cache is None:
+        cache = get_embedding_cache()
+    article = as_document(article)
+    synopsis = as_document(synopsis)
+    
+    article_chunks, chunk_ids = split_article(article, tokenizer, chunking)
+    rows = [synopsis.text] + synopsis.sentences
+    embeddings = get_batch_embeddings(rows + article_chunks, tokenizer, model, batch_size=batch_size, cache=cache,
+                                      token_ids=[None] * len(rows) + chunk_ids)
+    
+    return embeddings[:len(rows)] @ embeddings[len(rows):].T
+
+@tracing.traced("chunk_similarities", measure=lambda article, synopsis, *args, **kwargs:
+                len(document_text(article)) + len(document_text(synopsis)))
+def compute_chunk_similarities(article, synopsis, tokenizer, model, batch_size=DEFAULT_BATCH_SIZE, cache=None,
+                               chunking=DEFAULT_CHUNKING, max_tokens=MAX_MODEL_TOKENS, overlap=0, max_windows=None):
     """
     Split the article into chunks and compute similarity with the synopsis
-    to better handle longer texts
+    to better handle longer texts. article and synopsis may be text or
+    ParsedDocuments built once per request. Chunk embeddings are served from the
+    process-wide embedding cache unless another cache is passed.
+    Chunking options are those of split_article.
     """
-    # Split article into chunks of roughly equal size
-    article_sentences = sent_tokenize(article_text)
-    chunk_size = max(1, len(article_sentences) // 10)  # Aim for about 10 chunks
-    article_chunks = [' '.join(article_sentences[i:i+chunk_size]) 
-                     for i in range(0, len(article_sentences), chunk_size)]
+    if cache is None:
+        cache = get_embedding_cache()
+    
+    article_chunks, chunk_ids = split_article(article, tokenizer, chunking, max_tokens=max_tokens,
+                                              overlap=overlap, max_windows=max_windows)
     
-    # Get embeddings for synopsis and article chunks
-    synopsis_embedding = get_embeddings(synopsis_text, tokenizer, model)
-    chunk_similarities = []
+    # Embed the synopsis and all chunks together in batched forward passes
+    embeddings = get_batch_embeddings([document_text(synopsis)] + article_chunks, tokenizer, model,
+                                      batch_size=batch_size, cache=cache, token_ids=[None] + chunk_ids)
+    synopsis_embedding, chunk_embeddings = embeddings[0], embeddings[1:]
     
-    for chunk in article_chunks:
-        chunk_embedding = get_embeddings(chunk, tokenizer, model)
-        similarity = compute_similarity(synopsis_embedding, chunk_embedding)
-        chunk_similarities.append(similarity)
+    # Embeddings are L2-normalised, so one matrix product gives every cosine similarity
+    chunk_similarities = (chunk_embeddings @ synopsis_embedding).tolist()
     
     # Return both individual and average similarities
-    return chunk_similarities, sum(chunk_similarities) / len(chunk_similarities)
\ No newline at end of file
+    return chunk_similarities, sum(chunk_similarities) / len(chunk_similarities)
@@ -1,20 +1,83 @@
-from nltk.tokenize import sent_tokenize
 import streamlit as st
 
-def evaluate_synopsis(article_text, synopsis_text, tokenizer, model):
-    """Evaluate the quality of a synopsis based on the original article"""
+from utils.document import as_document, document_text
+from utils.tracing import traced
+
+@traced("evaluate", measure=lambda article, synopsis, *args, **kwargs: len(document_text(article)) + len(document_text(synopsis)))
+def evaluate_synopsis(article, synopsis, tokenizer, model, scoring_mode="chunks"):
+    """
+    Evaluate the quality of a synopsis based on the original article.
+    Both may be text or ParsedDocuments; each text is parsed at most once.
+    scoring_mode="sentence_matrix" scores coverage sentence by sentence (see evaluate_synopsis_matrix).
+    """
     from utils.embeddings import compute_chunk_similarities
+    article = as_document(article)
+    synopsis = as_document(synopsis)
+    
+    if scoring_mode == "sentence_matrix":
+        return evaluate_synopsis_matrix(article, synopsis, tokenizer, model)
     
     # Compute similarity metrics
-    chunk_similarities, avg_similarity = compute_chunk_similarities(article_text, synopsis_text, tokenizer, model)
+    chunk_similarities, avg_similarity = compute_chunk_similarities(article, synopsis, tokenizer, model)
+    
+    return score_synopsis(chunk_similarities, avg_similarity, article.word_count, synopsis)
+
+def evaluate_synopsis_matrix(article, synopsis, tokenizer, model):
+    """
+    Evaluate a synopsis from one similarity matrix between the whole synopsis, each
+    synopsis sentence and each article chunk. A chunk counts as covered when its
+    best-matching synopsis sentence is similar enough; coherence still uses the
+    whole synopsis. The result adds per-chunk coverage and sentence alignment, and
+    'chunk_similarities' (the whole-synopsis row) from which the default metrics follow.
+    """
+    from utils.embeddings import compute_similarity_matrix
+    article = as_document(article)
+    synopsis = as_document(synopsis)
+    
+    matrix = compute_similarity_matrix(article, synopsis, tokenizer, model)
+    whole_synopsis_row, sentence_rows = matrix[0], matrix[1:]
+    if sentence_rows.shape[0] == 0:
+        sentence_rows = matrix[:1]
+    
+    # Vectorized reductions over the (sentences x chunks) block
+    chunk_coverage, best_sentence = sentence_rows.max(dim=0)
+    sentence_alignment = sentence_rows.argmax(dim=1)
+    
+    chunk_similarities = whole_synopsis_row.tolist()
+    avg_similarity = whole_synopsis_row.mean().item()
+    evaluation = score_synopsis(chunk_similarities, avg_similarity, article.word_count, synopsis,
+                                coverage_similarities=chunk_coverage.tolist())
+    evaluation['chunk_similarities'] = [round(sim, 3) for sim in chunk_similarities]
+    evaluation['chunk_coverage'] = [round(sim, 3) for sim in chunk_coverage.tolist()]
+    evaluation['chunk_best_sentence'] = best_sentence.tolist()
+    evaluation['sentence_alignment'] = sentence_alignment.tolist()
+    return evaluation
+
+def evaluate_synopsis_with_index(article_index, synopsis, tokenizer, model, synopsis_embedding=None):
+    """
+    Evaluate a synopsis against a prebuilt ArticleIndex.
+    Only the synopsis is embedded (unless synopsis_embedding is given); the article side is reused from the index.
+    """
+    chunk_similarities, avg_similarity = article_index.chunk_similarities(document_text(synopsis), tokenizer, model,
+                                                                          synopsis_embedding=synopsis_embedding)
+    
+    return score_synopsis(chunk_similarities, avg_similarity, article_index.word_count, synopsis)
+
+def score_synopsis(chunk_similarities, avg_similarity, article_word_count, synopsis, coverage_similarities=None):
+    """
+    Turn chunk similarities and length statistics into the final score and feedback.
+    coverage_similarities, if given, replaces chunk_similarities for the coverage metric.
+    """
+    synopsis = as_document(synopsis)
+    if coverage_similarities is None:
+        coverage_similarities = chunk_similarities
     
     # Calculate coverage score (how many chunks are well-represented)
     coverage_threshold = 0.5  # Similarity threshold for "good coverage"
-    coverage_percentage = sum(1 for sim in chunk_similarities if sim > coverage_threshold) / len(chunk_similarities)
+    coverage_percentage = sum(1 for sim in coverage_similarities if sim > coverage_threshold) / len(coverage_similarities)
     
     # Calculate length ratio score (penalize if too short or too long)
-    article_word_count = len(article_text.split())
-    synopsis_word_count = len(synopsis_text.split())
+    synopsis_word_count = synopsis.word_count
     ideal_ratio = 0.2  # Synopsis should be ~20% of article length
     actual_ratio = synopsis_word_count / max(1, article_word_count)
     length_ratio_score = 1.0 - min(1.0, abs(actual_ratio - ideal_ratio) / ideal_ratio)
@@ -23,8 +86,8 @@ def evaluate_synopsis(article_text, synopsis_text, tokenizer, model):
     coherence_score = avg_similarity
     
     # Calculate clarity score (based on sentence structure, simplified here)
-    synopsis_sentences = sent_tokenize(synopsis_text)
-    avg_sentence_length = sum(len(sent.split()) for sent in synopsis_sentences) / max(1, len(synopsis_sentences))
+    sentence_word_counts = synopsis.sentence_word_counts()
+    avg_sentence_length = sum(sentence_word_counts) / max(1, len(sentence_word_counts))
     clarity_penalty = 0 if 10 <= avg_sentence_length <= 25 else (min(avg_sentence_length, 40) - 25) / 15
     clarity_score = 1.0 - min(1.0, clarity_penalty)
     
@@ -1,23 +1,286 @@
-import PyPDF2
+import codecs
+import contextlib
+import functools
+import hashlib
 import io
+import multiprocessing
 import os
+import signal
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from utils.tracing import traced
+
+# Extraction budgets so a pathological PDF can't hog a worker
+MAX_PDF_PAGES = 500
+MAX_FILE_BYTES = 50 * 1024 * 1024
+PDF_TIME_BUDGET = 60.0  # seconds
+
+# PDFs with at least this many pages are extracted over a process pool
+PARALLEL_PAGE_THRESHOLD = 40
+PAGES_PER_TASK = 10
+
+# Extracted text of recent PDFs, keyed by SHA-256 of the file bytes
+PDF_CACHE_SIZE = 16
+_pdf_text_cache = OrderedDict()
+_pdf_text_cache_lock = threading.Lock()
+
+# Prefix of upload temp files, so orphans can be found and swept
+TEMP_FILE_PREFIX = "temp_synopsis_"
+
+class ExtractionLimitError(Exception):
+    """Raised when a document exceeds a page, size or time budget"""
 
 def read_txt_file(file_path):
     """Read content from a text file"""
     with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
         return f.read()
 
-def read_pdf_file(file_path):
+def iter_pdf_pages(source, max_pages=MAX_PDF_PAGES, time_budget=PDF_TIME_BUDGET, start=0, stop=None):
+    """
+    Yield the text of each page of a PDF (a path, a binary file object or a parsed
+    PdfReader), one at a time. Empty pages yield an empty string.
+    time_budget is only checked between pages; see _wall_clock_limit for a hard limit.
+    """
+    import PyPDF2
+    
+    deadline = time.monotonic() + time_budget if time_budget else None
+    pdf_reader = source if isinstance(source, PyPDF2.PdfReader) else PyPDF2.PdfReader(source)
+    num_pages = len(pdf_reader.pages)
+    if max_pages and num_pages > max_pages:
+        raise ExtractionLimitError(f"PDF has {num_pages} pages; the limit is {max_pages}")
+    
+    for page_number in range(start, num_pages if stop is None else min(stop, num_pages)):
+        if deadline is not None and time.monotonic() > deadline:
+            raise ExtractionLimitError(f"PDF extraction exceeded {time_budget} seconds")
+        yield pdf_reader.pages[page_number].extract_text() or ""
+
+@contextlib.contextmanager
+def _wall_clock_limit(seconds):
+    """
+    Raise ExtractionLimitError wherever the block is after seconds, even inside a
+    single page or the initial parse. This relies on SIGALRM, so it only works in
+    the main thread on POSIX (e.g. batch_score.py pool workers); elsewhere it
+    yields False and does nothing.
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield False
+        return
+    
+    def expire(signum, frame):
+        raise ExtractionLimitError(f"PDF extraction exceeded {seconds} seconds")
+    
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield True
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+# PDF for the current extraction, set once per pool worker and parsed on first use
+_worker_pdf_data = None
+_worker_pdf_reader = None
+
+def _init_pdf_worker(data):
+    global _worker_pdf_data, _worker_pdf_reader
+    _worker_pdf_data = data
+    _worker_pdf_reader = None
+
+def _worker_reader():
+    """This worker's PdfReader, parsed once however many page ranges it extracts"""
+    import PyPDF2
+    global _worker_pdf_reader
+    
+    if _worker_pdf_reader is None:
+        _worker_pdf_reader = PyPDF2.PdfReader(io.BytesIO(_worker_pdf_data))
+    return _worker_pdf_reader
+
+def _count_pages(_=None):
+    """Worker: parse the PDF handed to _init_pdf_worker and return its page count"""
+    return len(_worker_reader().pages)
+
+def _extract_page_range(page_range):
+    """Worker: extract pages [start, stop) of the PDF handed to _init_pdf_worker"""
+    start, stop = page_range
+    return list(iter_pdf_pages(_worker_reader(), max_pages=None, time_budget=None, start=start, stop=stop))
+
+def _join_pages(pages):
+    """Join page texts once, skipping empty pages"""
+    return "".join(page_text + "\n" for page_text in pages if page_text)
+
+def _extract_parallel(data, num_pages, workers, deadline, time_budget, context=multiprocessing):
+    """Extract page ranges over a process pool; leaving the with-block terminates it, so a timed-out page can't keep running"""
+    page_ranges = [(start, start + PAGES_PER_TASK) for start in range(0, num_pages, PAGES_PER_TASK)]
+    # Each worker receives the PDF once and parses it once
+    with context.Pool(processes=workers, initializer=_init_pdf_worker, initargs=(bytes(data),)) as pool:
+        try:
+            pages = pool.map_async(_extract_page_range, page_ranges).get(timeout=_remaining(deadline))
+        except multiprocessing.TimeoutError:
+            raise ExtractionLimitError(f"PDF extraction exceeded {time_budget} seconds")
+    return _join_pages(page_text for page_range in pages for page_text in page_range)
+
+# Idle extraction children, kept for the next upload; see _extract_in_child
+MAX_IDLE_PDF_CHILDREN = 4
+_idle_pdf_children = []
+_idle_pdf_children_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def _child_context():
+    """
+    Start children from a forkserver (spawn where there is none): forking the
+    multi-threaded server can deadlock on a lock another thread held.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # Children start with the PDF code already imported; only takes effect before the forkserver starts
+    context.set_forkserver_preload([__name__, 'PyPDF2'])
+    return context
+
+def _pdf_child_main(connection):
+    """Child: parse each PDF sent on connection; extract it, or only count its pages if it is to be extracted in parallel"""
+    while True:
+        try:
+            data, max_pages, parallel = connection.recv()
+        except EOFError:
+            return
+        _init_pdf_worker(data)
+        try:
+            num_pages = _count_pages()
+            if max_pages and num_pages > max_pages:
+                raise ExtractionLimitError(f"PDF has {num_pages} pages; the limit is {max_pages}")
+            if parallel and num_pages >= PARALLEL_PAGE_THRESHOLD:
+                reply = (num_pages, None), None
+            else:
+                reply = (num_pages, _join_pages(_extract_page_range((0, num_pages)))), None
+        except Exception as e:
+            reply = None, e
+        finally:
+            _init_pdf_worker(None)
+        connection.send(reply)
+
+def _take_pdf_child():
+    with _idle_pdf_children_lock:
+        while _idle_pdf_children:
+            process, connection = _idle_pdf_children.pop()
+            if process.is_alive():
+                return process, connection
+            connection.close()
+    
+    context = _child_context()
+    connection, child_connection = context.Pipe()
+    process = context.Process(target=_pdf_child_main, args=(child_connection,), daemon=True)
+    process.start()
+    child_connection.close()
+    return process, connection
+
+def _release_pdf_child(child):
+    with _idle_pdf_children_lock:
+        if len(_idle_pdf_children) < MAX_IDLE_PDF_CHILDREN:
+            _idle_pdf_children.append(child)
+            return
+    process, connection = child
+    connection.close()  # The child exits on EOF
+    process.join()
+
+def _extract_in_child(data, max_pages, workers, deadline, time_budget):
+    """
+    Parse and extract in a child process that is killed when the budget runs out,
+    for threads that can't use _wall_clock_limit (e.g. Streamlit's script thread).
+    Children are reused across uploads; only one that timed out or failed is replaced,
+    so other sessions' extractions carry on.
+    """
+    process, connection = child = _take_pdf_child()
+    try:
+        connection.send((bytes(data), max_pages, workers != 1))
+        if not connection.poll(_remaining(deadline)):
+            raise ExtractionLimitError(f"PDF extraction exceeded {time_budget} seconds")
+        result, error = connection.recv()
+    except BaseException as e:
+        process.kill()
+        process.join()
+        connection.close()
+        if isinstance(e, EOFError):
+            raise RuntimeError("PDF extraction process exited unexpectedly") from e
+        raise
+    _release_pdf_child(child)
+    
+    if error is not None:
+        raise error
+    num_pages, text = result
+    if text is None:
+        text = _extract_parallel(data, num_pages, workers, deadline, time_budget, context=_child_context())
+    return text
+
+def read_pdf_bytes(data, max_pages=MAX_PDF_PAGES, max_bytes=MAX_FILE_BYTES, time_budget=PDF_TIME_BUDGET, workers=None):
+    """
+    Extract text from PDF content held in memory (bytes or memoryview).
+    time_budget bounds the whole extraction, parse included: by SIGALRM in the main
+    thread, otherwise by running it in a child process that is killed on timeout.
+    """
+    import PyPDF2
+    
+    size = memoryview(data).nbytes
+    if max_bytes and size > max_bytes:
+        raise ExtractionLimitError(f"File is {size} bytes; the limit is {max_bytes}")
+    
+    # Re-uploads of the same document skip extraction entirely
+    digest = hashlib.sha256(data).hexdigest()
+    with _pdf_text_cache_lock:
+        if digest in _pdf_text_cache:
+            _pdf_text_cache.move_to_end(digest)
+            return _pdf_text_cache[digest]
+    
+    deadline = time.monotonic() + time_budget if time_budget else None
+    # Pool workers (e.g. batch_score.py) are daemonic and can't start their own pool
+    can_fork = not multiprocessing.current_process().daemon
+    with _wall_clock_limit(time_budget) as limited:
+        if limited or not can_fork or not time_budget:
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+            num_pages = len(pdf_reader.pages)
+            if max_pages and num_pages > max_pages:
+                raise ExtractionLimitError(f"PDF has {num_pages} pages; the limit is {max_pages}")
+            if num_pages >= PARALLEL_PAGE_THRESHOLD and workers != 1 and can_fork:
+                text = _extract_parallel(data, num_pages, workers, deadline, time_budget)
+            else:
+                text = _join_pages(iter_pdf_pages(pdf_reader, max_pages=None, time_budget=time_budget))
+        else:
+            text = _extract_in_child(data, max_pages, workers, deadline, time_budget)
+    
+    with _pdf_text_cache_lock:
+        _pdf_text_cache[digest] = text
+        while len(_pdf_text_cache) > PDF_CACHE_SIZE:
+            _pdf_text_cache.popitem(last=False)
+    return text
+
+def read_pdf_file(file_path, max_pages=MAX_PDF_PAGES, max_bytes=MAX_FILE_BYTES, time_budget=PDF_TIME_BUDGET, workers=None):
     """Extract text from a PDF file"""
+    size = os.path.getsize(file_path)
+    if max_bytes and size > max_bytes:
+        raise ExtractionLimitError(f"File is {size} bytes; the limit is {max_bytes}")
+    
     with open(file_path, 'rb') as f:
-        pdf_reader = PyPDF2.PdfReader(f)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:  # Some pages might be empty
-                text += page_text + "\n"
-        return text
+        data = f.read()
+    return read_pdf_bytes(data, max_pages=max_pages, max_bytes=max_bytes, time_budget=time_budget, workers=workers)
+
+def clear_pdf_cache():
+    """Forget all cached PDF text"""
+    with _pdf_text_cache_lock:
+        _pdf_text_cache.clear()
 
+def evict_pdf_cache(digests):
+    """Forget the cached text of the given PDFs (SHA-256 hex digests of their bytes), leaving the rest"""
+    with _pdf_text_cache_lock:
+        for digest in digests:
+            _pdf_text_cache.pop(digest, None)
+
+@traced("extract_text", measure=lambda file_path: os.path.getsize(file_path))
 def extract_text_from_file(file_path):
     """Extract text from a file (PDF or TXT)"""
     if file_path.lower().endswith('.pdf'):
@@ -25,16 +288,60 @@ def extract_text_from_file(file_path):
     else:  # Assume it's a text file
         return read_txt_file(file_path)
 
+def sniff_encoding(data):
+    """Pick a text encoding from a byte-order mark, defaulting to UTF-8"""
+    head = bytes(data[:4])
+    for bom, encoding in ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+                          (codecs.BOM_UTF8, 'utf-8-sig'),
+                          (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if head.startswith(bom):
+            return encoding
+    return 'utf-8'
+
+def decode_text_bytes(data, chunk_size=64 * 1024):
+    """
+    Decode text held in memory chunk by chunk, without copying the buffer.
+    Undecodable bytes are replaced and newlines normalized, as read_txt_file does.
+    """
+    view = memoryview(data)
+    decoder = codecs.getincrementaldecoder(sniff_encoding(view))(errors='replace')
+    parts = [decoder.decode(view[start:start + chunk_size]) for start in range(0, view.nbytes, chunk_size)]
+    parts.append(decoder.decode(b'', final=True))
+    return "".join(parts).replace('\r\n', '\n').replace('\r', '\n')
+
+def _as_buffer(source):
+    """View an upload (Streamlit UploadedFile, BytesIO, bytes or memoryview) without copying it"""
+    if isinstance(source, memoryview):
+        return source
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer()
+    return memoryview(source)
+
+@traced("extract_text", measure=lambda source, filename, max_bytes=MAX_FILE_BYTES: _as_buffer(source).nbytes)
+def extract_text_from_buffer(source, filename, max_bytes=MAX_FILE_BYTES):
+    """Extract text from an in-memory upload (PDF or TXT, chosen by filename)"""
+    buffer = _as_buffer(source)
+    if max_bytes and buffer.nbytes > max_bytes:
+        raise ExtractionLimitError(f"File is {buffer.nbytes} bytes; the limit is {max_bytes}")
+    
+    if filename.lower().endswith('.pdf'):
+        return read_pdf_bytes(buffer, max_bytes=max_bytes)
+    else:  # Assume it's a text file
+        return decode_text_bytes(buffer)
+
 def save_uploaded_file(uploaded_file):
-    """Save an uploaded file to a temporary location and return the path"""
+    """
+    Save an uploaded file to a temporary location and return the path.
+    Only used when the temp-file fallback is enabled; see extract_text_from_buffer.
+    """
     if uploaded_file is None:
         return None
-        
-    # Create a temporary file to store the uploaded content
+    
+    # Create a uniquely named temporary file so concurrent sessions never collide
     file_extension = os.path.splitext(uploaded_file.name)[1]
-    temp_file = f"temp_{uploaded_file.name}"
+    fd, temp_file = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, suffix=file_extension)
     
-    with open(temp_file, "wb") as f:
+    with os.fdopen(fd, "wb") as f:
         f.write(uploaded_file.getbuffer())
     
-    return temp_file
\ No newline at end of file
+    return temp_file
@@ -0,0 +1,163 @@
+import difflib
+from collections import OrderedDict
+
+import torch
+
+from utils.article_index import ArticleIndex
+from utils.document import as_document
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import get_batch_embeddings
+from utils.evaluator import score_synopsis
+
+class IncrementalScorer:
+    """
+    Re-score successive versions of a synopsis against one article.
+    The article is indexed once. Each new version is diffed against the previous
+    one sentence by sentence: unchanged sentences keep their row of the
+    sentence-by-chunk similarity matrix, only changed or new sentences are
+    embedded (or taken from a bounded LRU of sentence embeddings, then from the
+    process-wide embedding cache like the article chunks), and the
+    per-chunk coverage is updated from the changed rows alone unless a chunk lost
+    its best-matching sentence. Coherence needs the embedding of the whole
+    synopsis, which any edit changes, so that one pass is repeated per new text.
+    Scores match evaluate_synopsis for the same scoring_mode.
+    """
+    
+    # Shared with every other session; not counted against the session memory budget
+    shared_attributes = ('tokenizer', 'model')
+
+    def __init__(self, article, tokenizer, model, max_sentence_embeddings=256):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.article_index = ArticleIndex.build(article, tokenizer, model, cache=get_embedding_cache())
+        self.max_sentence_embeddings = max_sentence_embeddings
+        self.sentence_embeddings = OrderedDict()  # sentence text -> embedding, least recent first
+        self.previous_text = None
+        self.previous_whole_row = None  # whole-synopsis similarity per chunk
+        self.previous_sentences = []
+        self.previous_rows = []  # similarity row per previous sentence
+        self.previous_alignment = []  # best chunk per previous sentence
+        self.previous_coverage = None  # (best similarity, best sentence) per chunk
+        self.last_stats = {}
+
+    def _remember(self, sentence, embedding):
+        self.sentence_embeddings[sentence] = embedding
+        self.sentence_embeddings.move_to_end(sentence)
+        while len(self.sentence_embeddings) > self.max_sentence_embeddings:
+            self.sentence_embeddings.popitem(last=False)
+
+    def _embed(self, synopsis, sentences):
+        """
+        The whole-synopsis similarity row and this call's sentence embeddings, in
+        one batched pass over whatever is not already known.
+        """
+        embeddings = {sentence: self.sentence_embeddings[sentence]
+                      for sentence in sentences if sentence in self.sentence_embeddings}
+        missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in embeddings]
+        whole_known = synopsis.text == self.previous_text
+        texts = ([] if whole_known else [synopsis.text]) + missing
+        vectors = get_batch_embeddings(texts, self.tokenizer, self.model, cache=get_embedding_cache()) if texts else None
+        
+        if whole_known:
+            whole_row = self.previous_whole_row
+        else:
+            whole_row = self.article_index.chunk_embeddings @ vectors[0]
+        embeddings.update(zip(missing, vectors[len(texts) - len(missing):] if missing else []))
+        
+        # Refresh the LRU only after this call's embeddings are all in hand
+        for sentence, embedding in embeddings.items():
+            self._remember(sentence, embedding)
+        self.last_stats['embedded'] = len(texts)
+        return whole_row, embeddings
+
+    def score(self, synopsis, scoring_mode="chunks"):
+        """Score a new version of the synopsis, reusing everything that did not change"""
+        synopsis = as_document(synopsis)
+        self.last_stats = {'sentences': synopsis.sentence_count, 'reused': 0}
+        
+        if scoring_mode != "sentence_matrix":
+            whole_row, _ = self._embed(synopsis, [])
+            self.previous_text, self.previous_whole_row = synopsis.text, whole_row
+            chunk_similarities = whole_row.tolist()
+            return score_synopsis(chunk_similarities, sum(chunk_similarities) / len(chunk_similarities),
+                                  self.article_index.word_count, synopsis)
+        
+        # Carry over the rows of unchanged sentences
+        sentences = synopsis.sentences
+        rows = [None] * len(sentences)
+        alignment = [None] * len(sentences)
+        moved = {}  # previous sentence index -> new index
+        matcher = difflib.SequenceMatcher(a=self.previous_sentences, b=sentences, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                rows[j1:j2] = self.previous_rows[i1:i2]
+                alignment[j1:j2] = self.previous_alignment[i1:i2]
+                moved.update(zip(range(i1, i2), range(j1, j2)))
+        changed = [j for j, row in enumerate(rows) if row is None]
+        self.last_stats['reused'] = len(sentences) - len(changed)
+        
+        whole_row, embeddings = self._embed(synopsis, [sentences[j] for j in changed])
+        if changed:
+            changed_rows = torch.stack([embeddings[sentences[j]] for j in changed]) @ self.article_index.chunk_embeddings.T
+            for j, row, best in zip(changed, changed_rows, changed_rows.argmax(dim=1).tolist()):
+                rows[j] = row
+                alignment[j] = best
+        
+        chunk_coverage, best_sentence = self._update_coverage(rows, changed, changed_rows if changed else None,
+                                                              moved, whole_row)
+        
+        self.previous_text, self.previous_whole_row = synopsis.text, whole_row
+        self.previous_sentences, self.previous_rows = sentences, rows
+        self.previous_alignment = alignment
+        self.previous_coverage = (chunk_coverage, best_sentence) if rows else None
+        
+        chunk_similarities = whole_row.tolist()
+        evaluation = score_synopsis(chunk_similarities, whole_row.mean().item(),
+                                    self.article_index.word_count, synopsis,
+                                    coverage_similarities=chunk_coverage.tolist())
+        evaluation['chunk_similarities'] = [round(sim, 3) for sim in chunk_similarities]
+        evaluation['chunk_coverage'] = [round(sim, 3) for sim in chunk_coverage.tolist()]
+        evaluation['chunk_best_sentence'] = best_sentence.tolist()
+        evaluation['sentence_alignment'] = alignment if rows else [int(whole_row.argmax())]
+        return evaluation
+
+    def _update_coverage(self, rows, changed, changed_rows, moved, whole_row):
+        """Best similarity and best sentence per chunk, touching only what the edit affected"""
+        if not rows:
+            # As in evaluate_synopsis_matrix, a synopsis without sentences covers with its whole row
+            return whole_row, torch.zeros_like(whole_row, dtype=torch.long)
+        if self.previous_coverage is None:
+            return torch.stack(rows).max(dim=0)
+        
+        values, best = self.previous_coverage
+        new_index = torch.tensor([moved.get(i, -1) for i in range(len(self.previous_rows))], dtype=torch.long)
+        values = values.clone()
+        best = new_index[best]
+        
+        if changed:
+            # A changed row takes over a chunk it matches better (or equally well, earlier)
+            changed_values, changed_best = changed_rows.max(dim=0)
+            changed_best = torch.tensor(changed, dtype=torch.long)[changed_best]
+            improved = (changed_values > values) | ((changed_values == values) & (changed_best < best))
+            values[improved] = changed_values[improved]
+            best[improved] = changed_best[improved]
+        
+        # Chunks whose best sentence was edited away are recomputed from every row
+        stale = best < 0
+        if stale.any():
+            column_values, column_best = torch.stack(rows)[:, stale].max(dim=0)
+            values[stale] = column_values
+            best[stale] = column_best
+        return values, best
+
+def get_session_incremental_scorer(article_key, article, tokenizer, model):
+    """
+    The calling Streamlit session's scorer for this article. Only one is kept per
+    session, so switching articles releases the previous one.
+    """
+    from utils.session_state import get_session_state
+    
+    state = get_session_state(incremental_scorer=None)
+    if state.incremental_scorer is None or state.incremental_scorer[0] != article_key:
+        state.incremental_scorer = (article_key, IncrementalScorer(article, tokenizer, model))
+    return state.incremental_scorer[1]
@@ -1,22 +1,247 @@
+import bisect
+import functools
 import os
 import re
 import tempfile
-import torch
-import nltk
-from nltk.tokenize import sent_tokenize
+import threading
 
-# Ensure NLTK data is downloaded
+from utils.document import _punkt_tokenizer, document_text
+from utils.tracing import traced
+
+_nltk_checked = False
+_nltk_lock = threading.Lock()
+
+# Ensure NLTK data is downloaded (checked once per process; NLTK itself is imported lazily)
 def ensure_nltk_data():
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt')
+    global _nltk_checked
+    if _nltk_checked:
+        return
+    with _nltk_lock:
+        if _nltk_checked:
+            return
+        import nltk
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            nltk.download('punkt')
+        _nltk_checked = True
+
+# Structured identifiers, in the order the original multi-pass version replaced them.
+# All but URLs start at a word boundary, so they share a single \b in the merged pattern.
+_DATE_WRITTEN = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2},? \d{4}\b'
+_PII_RULES = [
+    ('date_numeric', r'\d{1,2}/\d{1,2}/\d{2,4}\b', '[DATE]'),
+    ('date_written', _DATE_WRITTEN, '[DATE]'),
+    # The lookahead rejects words without an '@' before attempting the full email match
+    ('email', r'(?=[A-Za-z0-9._%+-]*@)[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
+    ('phone', r'\d{3}[-.]?\d{3}[-.]?\d{4}\b', '[PHONE]'),
+]
+_PII_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern, _ in _PII_RULES) + r')'
+    # The multi-pass version replaced dates before URLs, so a URL runs on through
+    # a written date ("https://x.com/Mar 3, 2021") as if it were one word
+    r'|(?P<url>https?://(?:\b' + _DATE_WRITTEN + r'|\S)+)'
+)
+_PLACEHOLDERS = {name: placeholder for name, _, placeholder in _PII_RULES}
+_PLACEHOLDERS['url'] = '[URL]'
+_WORD_PATTERN = re.compile(r'\S+')
+
+# Capitalized words that are not treated as names
+_CAPITALIZED_WHITELIST = frozenset([
+    'i', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+    'september', 'october', 'november', 'december',
+])
+
+# Punkt only breaks sentences after one of these end marks. This matches the rest
+# of a word containing one, and the whitespace up to the next word
+_END_MARKED_PATTERN = re.compile(r'[.?!](\S*)\s+')
+# An end mark directly followed by other punctuation, where Punkt may break inside a word
+_MID_WORD_BREAK_PATTERN = re.compile(r'[.?!][)";}\]*:@\'({\[?!]')
+# A word after the first that does not start with a lowercase letter or digit, so may be a name
+_CAPITALIZED_PATTERN = re.compile(r'\s([^\sa-z0-9]\S*)')
+# A plain word of letters ending in an end mark, which Punkt can decide from its type alone
+_PLAIN_END_PATTERN = re.compile(r'([^\W\d_]+)([.?!])')
+
+@functools.lru_cache(maxsize=1)
+def _undecided_types():
+    """Word types that Punkt may not break after: known abbreviations and collocation heads"""
+    params = _punkt_tokenizer()._params
+    return frozenset(params.abbrev_types) | {first for first, _ in params.collocations}
+
+def _word_start(text, position):
+    """Start of the word containing text[position]"""
+    while position > 0 and not text[position - 1].isspace():
+        position -= 1
+    return position
+
+def _context_start(text, start):
+    """
+    Start of the previous word, where Punkt's context for a break before text[start] begins.
+    For the second word it starts at the start of the text, as it does in Punkt.
+    """
+    end = start
+    while end > 0 and text[end - 1].isspace():
+        end -= 1
+    begin = _word_start(text, end)
+    return 0 if begin <= _WORD_PATTERN.search(text).start() else begin
+
+@functools.lru_cache(maxsize=4096)
+def _window_starts(window):
+    """Offsets at which Punkt starts a sentence in a window of a few words; the same phrases recur"""
+    return tuple(start for start, _ in _punkt_tokenizer().span_tokenize(window))
+
+def _punkt_starts(text, window_start, window_end):
+    """Offsets in text at which Punkt starts a sentence within text[window_start:window_end]"""
+    return [window_start + offset for offset in _window_starts(text[window_start:window_end])]
+
+def _starts_sentence(text, previous_word, start, end):
+    """
+    Whether Punkt (as used by sent_tokenize) starts a sentence at the word text[start:end].
+    Punkt decides every break from the word before it and the token after it alone,
+    so only those two words are looked at, never the whole text.
+    """
+    plain = _PLAIN_END_PATTERN.fullmatch(previous_word)
+    if plain:
+        stem, mark = plain.groups()
+        # '?' and '!' always break; so does a period after a word Punkt has no rule for
+        if mark != '.' or (len(stem) > 1 and stem.lower() not in _undecided_types()):
+            return True
+    return start in _punkt_starts(text, _context_start(text, start), end)
+
+def _mid_word_starts(text, start, end):
+    """Sentence starts Punkt puts strictly inside the word text[start:end]"""
+    next_word = _WORD_PATTERN.search(text, end)
+    window_end = next_word.end() if next_word else len(text)
+    return [offset for offset in _punkt_starts(text, _context_start(text, start), window_end) if start < offset < end]
 
-def anonymize_text(text):
+def _word_edits(text):
+    """
+    (start, end, pieces) for every word the name rule or a sentence break inside the
+    word changes, in text order. pieces are the (start, end, output word) replacing it.
+    Only capitalized words and words with a possible break inside are looked at.
+    """
+    candidates = {match.start(1): match.end(1) for match in _CAPITALIZED_PATTERN.finditer(text)}
+    mid_word = set()
+    for match in _MID_WORD_BREAK_PATTERN.finditer(text):
+        start = _word_start(text, match.start())
+        mid_word.add(start)
+        candidates[start] = _WORD_PATTERN.match(text, start).end()
+    if not candidates:
+        return
+    # Start of the word after each word with an end mark -> (that mark, the word's end)
+    after_end_mark = {match.end(): (match.start(), match.end(1)) for match in _END_MARKED_PATTERN.finditer(text)}
+    first_start = _WORD_PATTERN.search(text).start()
+    for start in sorted(candidates):
+        end = candidates[start]
+        word = text[start:end]
+        new_word = word
+        if start != first_start and word[0].isupper() and word.lower() not in _CAPITALIZED_WHITELIST:
+            previous = after_end_mark.get(start)
+            if previous is None:
+                new_word = '[NAME]'
+            else:
+                mark, previous_end = previous
+                previous_word = text[_word_start(text, mark):previous_end]
+                if not _starts_sentence(text, previous_word, start, end):
+                    new_word = '[NAME]'
+        # Where Punkt breaks inside a word, the original split it in two; the later
+        # pieces start a sentence, so only the first can be a name
+        starts = [start]
+        if start in mid_word:
+            starts += _mid_word_starts(text, start, end)
+        if len(starts) == 1 and new_word == word:
+            continue
+        ends = starts[1:] + [end]
+        pieces = [(piece_start, piece_end, text[piece_start:piece_end]) for piece_start, piece_end in zip(starts, ends)]
+        if new_word != word:
+            pieces[0] = (start, ends[0], new_word)
+        yield start, end, pieces
+
+def _replace_identifiers(text):
+    """
+    Replace all structured identifiers in one scan of the text.
+    Returns the new text and segments (new_start, new_end, src_start, src_end, replaced).
+    """
+    pieces = []
+    segments = []
+    src_pos = 0
+    new_pos = 0
+    for match in _PII_PATTERN.finditer(text):
+        if match.start() > src_pos:
+            literal = text[src_pos:match.start()]
+            pieces.append(literal)
+            segments.append((new_pos, new_pos + len(literal), src_pos, match.start(), False))
+            new_pos += len(literal)
+        placeholder = _PLACEHOLDERS[match.lastgroup]
+        pieces.append(placeholder)
+        segments.append((new_pos, new_pos + len(placeholder), match.start(), match.end(), True))
+        new_pos += len(placeholder)
+        src_pos = match.end()
+    if src_pos < len(text):
+        pieces.append(text[src_pos:])
+        segments.append((new_pos, new_pos + len(text) - src_pos, src_pos, len(text), False))
+    return ''.join(pieces), segments
+
+def _source_offset(segments, segment_starts, offset, is_end):
+    """Map an offset in the identifier-replaced text back to the original text"""
+    index = bisect.bisect_right(segment_starts, offset - 1 if is_end else offset) - 1
+    new_start, _, src_start, src_end, replaced = segments[index]
+    if replaced:
+        return src_end if is_end else src_start
+    return src_start + (offset - new_start)
+
+@traced("anonymize", measure=lambda text, return_spans=False: len(document_text(text)))
+def anonymize_text(text, return_spans=False):
     """
     Replace names, dates, and specific identifiers with placeholders.
     This is a simple implementation - a more robust solution would use NER.
+    text may be a string or a ParsedDocument. Sentence starts are decided as Punkt
+    decides them in the original, but only for capitalized words after an end mark,
+    the one case where the split changes the output, and from the two words around
+    each; Punkt itself only runs on those few words when the previous one is not plain.
+    With return_spans=True, also returns (out_start, out_end, src_start, src_end)
+    for every output word, mapping it back to the input text.
     """
+    text = document_text(text)
+    if return_spans:
+        replaced, segments = _replace_identifiers(text)
+        segment_starts = [segment[0] for segment in segments]
+    else:
+        replaced = _PII_PATTERN.sub(lambda match: _PLACEHOLDERS[match.lastgroup], text)
+    
+    # Replace proper nouns (crude approximation - would be better with NER)
+    # Look for capitalized words not at the start of sentences
+    if not return_spans:
+        pieces = []
+        position = 0
+        for start, end, words in _word_edits(replaced):
+            pieces.append(replaced[position:start])
+            pieces.append(' '.join(word for _, _, word in words))
+            position = end
+        pieces.append(replaced[position:])
+        return " ".join(''.join(pieces).split())
+    
+    edits = {start: words for start, _, words in _word_edits(replaced)}
+    output = []
+    spans = []
+    out_pos = 0
+    for match in _WORD_PATTERN.finditer(replaced):
+        for start, end, word in edits.get(match.start(), ((match.start(), match.end(), match.group()),)):
+            output.append(word)
+            spans.append((out_pos, out_pos + len(word),
+                          _source_offset(segments, segment_starts, start, False),
+                          _source_offset(segments, segment_starts, end, True)))
+            out_pos += len(word) + 1
+    return " ".join(output), spans
+
+def anonymize_text_reference(text):
+    """
+    Original multi-pass anonymizer, kept as the reference that anonymize_text
+    is checked against (see benchmarks/anonymizer_benchmark.py).
+    """
+    from nltk.tokenize import sent_tokenize
+    
     # Replace dates (simple pattern)
     text = re.sub(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b', '[DATE]', text)
     text = re.sub(r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2},? \d{4}\b', '[DATE]', text)
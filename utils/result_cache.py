@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Bump when scoring logic changes so stale evaluations are never served
+SCORING_VERSION = "2"
+
+def content_hash(data):
+    """SHA-256 of uploaded bytes (bytes, bytearray or memoryview)"""
+    return hashlib.sha256(data).hexdigest()
+
+def scoring_config_key():
+    """Identify the model and configuration that produce an evaluation"""
+    return "|".join([
+        SCORING_VERSION,
+        os.environ.get("SYNOPSIS_MODEL_PATH") or "default-model",
+        os.environ.get("SYNOPSIS_BACKEND") or "fp32",
+        os.environ.get("SCORING_SERVICE_URL") or "local",
+    ])
+
+class ResultCache:
+    """
+    Memory-only memo of pipeline results, bounded by entry count and TTL.
+    Entries expire after ttl_seconds and the oldest are dropped beyond max_entries.
+    Expired entries are swept on every access, not just when their own key is read.
+    """
+
+    def __init__(self, max_entries=32, ttl_seconds=900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self.entries.items() if now > expires_at]:
+            del self.entries[key]
+
+    def expire(self):
+        """Drop expired entries (also run by the session sweeper for idle sessions)"""
+        with self.lock:
+            self._expire()
+
+    def get(self, key):
+        with self.lock:
+            self._expire()
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self._expire()
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def purge(self):
+        """Drop every entry (used when the user clears their data or the session ends)"""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        with self.lock:
+            self._expire()
+            return len(self.entries)
+
+def get_session_result_cache():
+    """The calling Streamlit session's result cache; discarded when the session store evicts or expires the session"""
+    from utils.session_state import get_session_state
+    
+    state = get_session_state(result_cache=None)
+    if state.result_cache is None:
+        state.result_cache = ResultCache()
+    return state.result_cache
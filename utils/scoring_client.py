@@ -0,0 +1,23 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+def get_scoring_service_url():
+    """URL of a remote scoring service, if the app is configured to use one"""
+    return os.environ.get("SCORING_SERVICE_URL") or None
+
+def score_remote(article_text, synopsis_text, service_url, timeout=60, anonymize=False):
+    """Score a synopsis with a running scoring_service.py; texts are expected to be anonymized already"""
+    body = json.dumps({'article': article_text, 'synopsis': synopsis_text, 'anonymize': anonymize}).encode('utf-8')
+    request = urllib.request.Request(service_url.rstrip('/') + '/score', data=body,
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 503:
+            raise RuntimeError("The scoring service is busy. Please try again in a moment.")
+        raise RuntimeError(f"The scoring service returned an error ({e.code}).")
+    except urllib.error.URLError as e:
+        raise RuntimeError(f"Could not reach the scoring service: {e.reason}")
@@ -1,16 +1,30 @@
 import base64
 import json
+import os
 import pickle
+import sys
+import tempfile
+import threading
+import time
+import types
 import uuid
 import re
+from collections import OrderedDict, deque
 
 import streamlit as st
-from streamlit.runtime.scriptrunner import ScriptRunner, ScriptRunnerImpl, RerunData
 from streamlit.runtime.scriptrunner.script_run_context import (
     get_script_run_ctx,
     add_script_run_ctx,
 )
 
+from utils.file_utils import TEMP_FILE_PREFIX, evict_pdf_cache
+from utils.privacy import cleanup_temp_files
+
+# Memory budget for all sessions in this process, and how long an idle session is kept
+DEFAULT_MAX_BYTES = int(float(os.environ.get("SYNOPSIS_SESSION_MEMORY_MB", "512")) * 1024 * 1024)
+# (15 minutes, as promised by the privacy notice)
+DEFAULT_IDLE_TTL = float(os.environ.get("SYNOPSIS_SESSION_IDLE_TTL", "900"))
+
 
 class SessionState:
     """
@@ -57,6 +71,220 @@ class SessionState:
         self.__dict__.update(state)
 
 
+def estimate_size(obj):
+    """
+    Approximate bytes reachable from obj: containers, object attributes and slots,
+    plus the buffers of numpy arrays and tensors. Attributes named in a class's
+    shared_attributes (e.g. the model held by a scorer) are not counted.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(item))
+        
+        nbytes = getattr(item, 'nbytes', None)
+        if isinstance(nbytes, int):
+            total += nbytes
+            continue
+        total += sys.getsizeof(item, 0)
+        
+        if isinstance(item, (str, bytes, bytearray, int, float, bool)) or item is None:
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        else:
+            shared = getattr(type(item), 'shared_attributes', ())
+            attributes = getattr(item, '__dict__', None) or {}
+            stack.extend(value for name, value in attributes.items() if name not in shared)
+            for name in getattr(type(item), '__slots__', ()):
+                if name not in shared and hasattr(item, name):
+                    stack.append(getattr(item, name))
+    return total
+
+
+def _purge_shared_caches(state):
+    """
+    Evict what a session added to the process-wide caches: the text of its uploads
+    (upload_hashes) and the embeddings its scoring computed (embedding_keys).
+    Other sessions' entries stay.
+    """
+    evict_pdf_cache(getattr(state, 'upload_hashes', ()))
+    embedding_keys = getattr(state, 'embedding_keys', None)
+    if embedding_keys:
+        # Only a session that scored has keys, so the cache (and torch) is loaded by then
+        from utils.embedding_cache import get_embedding_cache
+        get_embedding_cache().evict(embedding_keys)
+
+
+class _SessionEntry:
+    __slots__ = ('state', 'nbytes', 'last_access', 'temp_files')
+
+    def __init__(self, state):
+        self.state = state
+        self.nbytes = 0
+        self.last_access = time.monotonic()
+        self.temp_files = set()
+
+
+class SessionStore:
+    """
+    SessionState objects for every session of this server process, under a hard
+    memory budget. Sessions are kept in least-recently-used order; after a run
+    changes a session, account() re-measures it and evicts the least recently used
+    other sessions until the total fits. Sessions idle for longer than
+    idle_ttl_seconds are dropped by expire_idle(), which also runs on every get().
+    Removing a session, however it happens, also deletes the temp files it
+    registered and evicts what it added to the shared caches (see _purge_shared_caches).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, idle_ttl_seconds=DEFAULT_IDLE_TTL):
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sessions = OrderedDict()  # session_id -> _SessionEntry, least recent first
+        self.bytes_held = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.RLock()
+
+    def get(self, session_id, **kwargs):
+        """
+        The session's state, created if it doesn't exist yet. Defaults are set for
+        any of the given attributes the state doesn't have, so helpers that keep
+        their own attribute (result cache, incremental scorer) can be called in any order.
+        """
+        with self.lock:
+            self.expire_idle()
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                entry = self.sessions[session_id] = _SessionEntry(SessionState(**kwargs))
+            else:
+                self.sessions.move_to_end(session_id)
+                entry.last_access = time.monotonic()
+                for key, val in kwargs.items():
+                    if not hasattr(entry.state, key):
+                        setattr(entry.state, key, val)
+            return entry.state
+
+    def account(self, session_id):
+        """Re-measure a session after it changed, then evict others until the store fits its budget"""
+        with self.lock:
+            entry = self.sessions.get(session_id)
+        if entry is None:
+            return 0
+        
+        # Measured outside the lock: only this session's own run mutates its state
+        nbytes = estimate_size(entry.state)
+        with self.lock:
+            if self.sessions.get(session_id) is entry:
+                self.bytes_held += nbytes - entry.nbytes
+                entry.nbytes = nbytes
+            # The session being served is never evicted, even if it alone exceeds the budget
+            while self.bytes_held > self.max_bytes:
+                victim = next((other for other in self.sessions if other != session_id), None)
+                if victim is None:
+                    break
+                self._remove(victim)
+                self.evictions += 1
+        return nbytes
+
+    def expire_idle(self):
+        """Drop every session idle for longer than idle_ttl_seconds; returns how many were dropped"""
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        expired = 0
+        with self.lock:
+            # Least recently used first, so stop at the first session still in use
+            while self.sessions:
+                session_id, entry = next(iter(self.sessions.items()))
+                if entry.last_access >= cutoff:
+                    break
+                self._remove(session_id)
+                expired += 1
+            self.expirations += expired
+        return expired
+
+    def expire_results(self):
+        """Drop expired entries from every live session's result cache"""
+        with self.lock:
+            caches = [getattr(entry.state, 'result_cache', None) for entry in self.sessions.values()]
+        for cache in caches:
+            if cache is not None:
+                cache.expire()
+
+    def drop(self, session_id):
+        """Forget a session and delete its temp files"""
+        with self.lock:
+            if session_id in self.sessions:
+                self._remove(session_id)
+
+    def _remove(self, session_id):
+        entry = self.sessions.pop(session_id)
+        self.bytes_held -= entry.nbytes
+        cleanup_temp_files(entry.temp_files)
+        _purge_shared_caches(entry.state)
+
+    def register_temp_file(self, session_id, path):
+        """Tie a temp file to a session so it is deleted with the session, and never swept while live"""
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                entry = self.sessions[session_id] = _SessionEntry(SessionState())
+            entry.temp_files.add(path)
+
+    def release_temp_files(self, session_id):
+        """Delete the temp files a session registered (called at the end of each run)"""
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            paths = list(entry.temp_files) if entry else []
+            if entry:
+                entry.temp_files.clear()
+        cleanup_temp_files(paths)
+
+    def live_temp_files(self):
+        with self.lock:
+            return {path for entry in self.sessions.values() for path in entry.temp_files}
+
+    def stats(self):
+        with self.lock:
+            return {
+                'live_sessions': len(self.sessions),
+                'bytes_held': self.bytes_held,
+                'max_bytes': self.max_bytes,
+                'largest_session_bytes': max((entry.nbytes for entry in self.sessions.values()), default=0),
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'temp_files': sum(len(entry.temp_files) for entry in self.sessions.values()),
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store():
+    """The process-wide SessionStore"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+        return _store
+
+
+def _current_session_id():
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        raise RuntimeError(
+            "Could not get session info for this Streamlit app. "
+            "get_session_state must be called from a running Streamlit script."
+        )
+    return ctx.session_id
+
+
 def get_session_state(**kwargs):
     """
     Gets a SessionState object for the current session.
@@ -64,31 +292,72 @@ def get_session_state(**kwargs):
     Parameters
     ----------
     **kwargs : any
-        Default values you want to add to the session state, if it doesn't exist yet.
+        Default values for attributes the session state doesn't have yet.
     Returns
     -------
     SessionState
         The session state for this session.
     """
-    ctx = get_script_run_ctx()
-    session_id = ctx.session_id
-    session_info = ctx.session_info
+    return get_session_store().get(_current_session_id(), **kwargs)
+
+
+def account_session_state():
+    """Record the current session's size after a run, evicting idle sessions if over budget"""
+    return get_session_store().account(_current_session_id())
+
+
+def clear_session_state():
+    """Drop everything held for the current session, including its temp files and shared cache entries"""
+    get_session_store().drop(_current_session_id())
 
-    if session_info is None:
-        raise RuntimeError(
-            "Could not get session info for this Streamlit app. "
-            "Are you using Streamlit 0.64.0 or later? "
-        )
 
-    # Create SessionState key in session_info if it doesn't exist
-    if not hasattr(session_info, "session_state"):
-        session_info.session_state = {}
+def register_temp_file(path):
+    get_session_store().register_temp_file(_current_session_id(), path)
+
+
+def release_temp_files():
+    get_session_store().release_temp_files(_current_session_id())
+
+
+def sweep_temp_files(store, directory=None, max_age_seconds=3600):
+    """
+    Delete upload temp files older than max_age_seconds that no live session
+    holds, e.g. left behind by a crashed run. Returns the paths removed.
+    """
+    directory = directory or tempfile.gettempdir()
+    live = store.live_temp_files()
+    cutoff = time.time() - max_age_seconds
+    removed = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.startswith(TEMP_FILE_PREFIX) or entry.path in live:
+                continue
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed.append(entry.path)
+            except OSError:
+                pass  # Already gone or not ours to delete
+    return removed
 
-    # Create SessionState object for this session_id if it doesn't exist
-    if session_id not in session_info.session_state:
-        session_info.session_state[session_id] = SessionState(**kwargs)
 
-    return session_info.session_state[session_id]
+def start_session_sweeper(store=None, interval_seconds=60, max_age_seconds=3600):
+    """Expire idle sessions and cached results, and sweep orphaned temp files, from a daemon thread"""
+    store = store or get_session_store()
+    
+    def sweep():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                store.expire_idle()
+                store.expire_results()
+                sweep_temp_files(store, max_age_seconds=max_age_seconds)
+            except Exception:
+                pass  # Keep sweeping; a failed pass is retried on the next tick
+    
+    thread = threading.Thread(target=sweep, name="session-sweeper", daemon=True)
+    thread.start()
+    return thread
 
 
 def set_page_config():
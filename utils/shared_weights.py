@@ -0,0 +1,142 @@
+import gc
+import hashlib
+import os
+import re
+
+import torch
+from transformers import AutoConfig, AutoModel
+
+def resident_memory():
+    """
+    This process's resident memory in bytes from /proc/self/status: total ('rss'),
+    private ('anon') and file-backed ('file'; memory-mapped weights are counted
+    here and shared with every process mapping the same file).
+    Empty where /proc is unavailable.
+    """
+    fields = {'VmRSS': 'rss', 'RssAnon': 'anon', 'RssFile': 'file'}
+    usage = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    usage[fields[name]] = int(value.split()[0]) * 1024  # Reported in kB
+    except OSError:
+        pass
+    return usage
+
+# Files whose contents or size and mtime identify the checkpoint of a model
+CHECKPOINT_FILES = ('model.safetensors', 'model.safetensors.index.json', 'pytorch_model.bin',
+                    'pytorch_model.bin.index.json')
+
+def model_fingerprint(model_path, local_only=False):
+    """
+    Hash of config.json plus the size and modification time of each checkpoint
+    file, so a model upgraded in place (or a new hub snapshot) maps to a new
+    weights file instead of the stale one.
+    """
+    from transformers.utils import cached_file
+    
+    digest = hashlib.sha256()
+    for name in ('config.json',) + CHECKPOINT_FILES:
+        path = cached_file(model_path, name, local_files_only=local_only,
+                           _raise_exceptions_for_missing_entries=False,
+                           _raise_exceptions_for_connection_errors=False)
+        if path is None:
+            continue
+        if name == 'config.json':
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        else:
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+def weights_file(weights_dir, model_path, local_only=False):
+    """Where the current weights of model_path are materialized inside weights_dir"""
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', os.path.basename(model_path.rstrip('/\\')) or 'model')
+    digest = hashlib.sha256(os.path.abspath(model_path).encode('utf-8') if os.path.isdir(model_path)
+                            else model_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(weights_dir, f"{name}-{digest}-{model_fingerprint(model_path, local_only)}.pt")
+
+def _stale_weights(path):
+    """Earlier versions of the same model's weights file next to path"""
+    prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+    directory = os.path.dirname(path) or '.'
+    return [os.path.join(directory, entry) for entry in os.listdir(directory)
+            if entry.startswith(prefix) and entry.endswith('.pt') and entry != os.path.basename(path)]
+
+def materialize_weights(model_path, path, local_only=False):
+    """
+    Write the model's weights to path unless it is already there: the state_dict
+    plus the non-persistent buffers (e.g. position_ids), which a model built
+    without initialisation would otherwise lack.
+    The first process does the work under an exclusive file lock; processes that
+    arrive meanwhile wait for it and then reuse the finished file. Weights of an
+    earlier version of the model are removed (processes still mapping them keep
+    their pages until they exit).
+    """
+    import fcntl
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                return False
+            model = AutoModel.from_pretrained(model_path, local_files_only=local_only)
+            state_dict = model.state_dict()
+            buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state_dict}
+            # Write to a temporary name so a crash never leaves a truncated file behind
+            temporary = f"{path}.{os.getpid()}.tmp"
+            torch.save({'state_dict': state_dict, 'buffers': buffers}, temporary)
+            os.replace(temporary, path)
+            for stale in _stale_weights(path):
+                for leftover in (stale, stale + '.lock'):
+                    try:
+                        os.remove(leftover)
+                    except OSError:
+                        pass
+            return True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def load_shared_model(model_path, weights_dir, local_only=False):
+    """
+    Load the model with its weights memory-mapped from a file shared by every
+    process on the node, instead of a private copy per process.
+    The model is built on the meta device, so nothing is allocated or randomly
+    initialised, and the mapped tensors are assigned in place. The mapping is
+    copy-on-write, so inference (which never writes weights) keeps the pages
+    shared. Resident memory before and after is attached as model.memory_report.
+    A changed config or checkpoint is materialized to a new file automatically.
+    """
+    before = resident_memory()
+    path = weights_file(weights_dir, model_path, local_only)
+    created = materialize_weights(model_path, path, local_only)
+    
+    config = AutoConfig.from_pretrained(model_path, local_files_only=local_only)
+    with torch.device('meta'):
+        model = AutoModel.from_config(config)
+    weights = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    model.load_state_dict(weights['state_dict'], assign=True)
+    for name, buffer in weights['buffers'].items():
+        module_name, _, buffer_name = name.rpartition('.')
+        model.get_submodule(module_name)._buffers[buffer_name] = buffer
+    missing = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers()) if tensor.is_meta]
+    if missing:
+        raise RuntimeError(f"{path} does not provide {', '.join(missing)}; delete it to rebuild")
+    model.eval()
+    del weights
+    gc.collect()
+    
+    after = resident_memory()
+    model.memory_report = {
+        'weights_file': path,
+        'materialized_here': created,
+        'rss_before': before.get('rss'),
+        'rss_after': after.get('rss'),
+        'rss_anon_after': after.get('anon'),
+        'rss_file_after': after.get('file'),
+    }
+    return model
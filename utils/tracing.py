@@ -0,0 +1,245 @@
+import contextvars
+import functools
+import os
+import resource
+import threading
+import time
+
+# Disabled unless SYNOPSIS_TRACING is set or enable_tracing() is called
+_enabled = os.environ.get("SYNOPSIS_TRACING", "").lower() not in ("", "0", "false")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span = contextvars.ContextVar("synopsis_current_span", default=None)
+_lock = threading.Lock()
+_stages = {}
+_gauge_sources = []
+
+def is_enabled():
+    return _enabled
+
+def enable_tracing(enabled=True):
+    """Turn span recording on or off for this process"""
+    global _enabled
+    _enabled = enabled
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+class StageMetrics:
+    """Aggregated measurements for one pipeline stage"""
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.bytes = 0
+        self.tokens = 0
+        self.errors = 0
+        self.peak_memory_delta = 0  # Largest growth of peak RSS seen in one span (bytes)
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class Span:
+    """Measure wall time, CPU time, bytes, tokens and peak-memory growth of one stage"""
+
+    def __init__(self, name, bytes_processed=0):
+        self.name = name
+        self.bytes = bytes_processed
+        self.tokens = 0
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def add_tokens(self, count):
+        self.tokens += count
+
+    def __enter__(self):
+        self.token = _current_span.set(self)
+        self.peak_before = _peak_rss_bytes()
+        self.cpu_start = time.thread_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.thread_time() - self.cpu_start
+        memory_delta = _peak_rss_bytes() - self.peak_before
+        _current_span.reset(self.token)
+        
+        with _lock:
+            stage = _stages.setdefault(self.name, StageMetrics())
+            stage.wall.observe(wall)
+            stage.cpu.observe(cpu)
+            stage.bytes += self.bytes
+            stage.tokens += self.tokens
+            stage.peak_memory_delta = max(stage.peak_memory_delta, memory_delta)
+            if exc_type is not None:
+                stage.errors += 1
+        return False
+
+class _NoopSpan:
+    """Returned when tracing is disabled, so instrumented code pays almost nothing"""
+
+    def add_bytes(self, count):
+        pass
+
+    def add_tokens(self, count):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name, bytes_processed=0):
+    """Context manager recording one stage: `with span("extract", len(data)): ...`"""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, bytes_processed)
+
+def traced(name, measure=None):
+    """
+    Decorator recording every call of a function as a span.
+    measure(*args, **kwargs) may return the number of bytes the call processes.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, measure(*args, **kwargs) if measure else 0):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def add_tokens(count):
+    """Attribute embedded tokens to the innermost active span"""
+    current = _current_span.get()
+    if current is not None:
+        current.add_tokens(count)
+
+def reset_metrics():
+    with _lock:
+        _stages.clear()
+
+def snapshot():
+    """Per-stage summary: calls, mean wall/CPU ms, bytes, tokens, errors, peak memory growth"""
+    with _lock:
+        return {
+            name: {
+                'calls': stage.wall.count,
+                'mean_wall_ms': stage.wall.sum / stage.wall.count * 1000 if stage.wall.count else 0.0,
+                'mean_cpu_ms': stage.cpu.sum / stage.cpu.count * 1000 if stage.cpu.count else 0.0,
+                'bytes': stage.bytes,
+                'tokens': stage.tokens,
+                'errors': stage.errors,
+                'peak_memory_delta_mb': stage.peak_memory_delta / (1024 * 1024),
+            }
+            for name, stage in sorted(_stages.items())
+        }
+
+def _histogram_lines(metric, label, histogram):
+    lines = []
+    for bound, count in histogram.cumulative():
+        lines.append(f'{metric}_bucket{{stage="{label}",le="{bound}"}} {count}')
+    lines.append(f'{metric}_bucket{{stage="{label}",le="+Inf"}} {histogram.count}')
+    lines.append(f'{metric}_sum{{stage="{label}"}} {histogram.sum}')
+    lines.append(f'{metric}_count{{stage="{label}"}} {histogram.count}')
+    return lines
+
+def render_prometheus():
+    """All stage metrics in the Prometheus text exposition format"""
+    with _lock:
+        stages = sorted(_stages.items())
+        lines = []
+        for metric, kind, description, attribute in (
+            ('synopsis_stage_wall_seconds', 'histogram', 'Wall time per pipeline stage', 'wall'),
+            ('synopsis_stage_cpu_seconds', 'histogram', 'CPU time per pipeline stage', 'cpu'),
+        ):
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, stage in stages:
+                lines.extend(_histogram_lines(metric, name, getattr(stage, attribute)))
+        for metric, kind, description, attribute in (
+            ('synopsis_stage_bytes_total', 'counter', 'Bytes processed per pipeline stage', 'bytes'),
+            ('synopsis_stage_tokens_total', 'counter', 'Tokens embedded per pipeline stage', 'tokens'),
+            ('synopsis_stage_errors_total', 'counter', 'Failed calls per pipeline stage', 'errors'),
+            ('synopsis_stage_peak_memory_delta_bytes', 'gauge', 'Largest peak RSS growth during one call', 'peak_memory_delta'),
+        ):
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, stage in stages:
+                lines.append(f'{metric}{{stage="{name}"}} {getattr(stage, attribute)}')
+        sources = list(_gauge_sources)
+    for source in sources:
+        for metric, (description, value) in source().items():
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+def register_gauges(source):
+    """Add gauges to render_prometheus(); source() returns {metric: (description, value)}"""
+    with _lock:
+        if source not in _gauge_sources:
+            _gauge_sources.append(source)
+
+def render_sidebar_panel():
+    """Show the per-stage summary in the Streamlit sidebar"""
+    import streamlit as st
+    
+    with st.sidebar.expander("⏱️ Pipeline Metrics"):
+        metrics = snapshot()
+        if not metrics:
+            st.caption("No stages recorded yet.")
+            return
+        st.table([{'stage': name, **values} for name, values in metrics.items()])
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve render_prometheus() at http://host:port/metrics from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the app logs
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,80 @@
+import threading
+import time
+
+# Model loading state shared by every session in this server process
+_state = {'status': 'idle', 'error': None, 'model': None, 'started_at': None, 'ready_at': None}
+_lock = threading.Lock()
+_done = threading.Event()
+
+WARMUP_TEXT = "This sentence warms up the embedding model before the first request."
+
+def start_background_warmup():
+    """Load the embedding model and run one warm-up inference on a background thread, once per process"""
+    with _lock:
+        if _state['status'] in ('loading', 'ready'):
+            return
+        # Idle, or a previous attempt failed and is retried
+        _done.clear()
+        _state['status'] = 'loading'
+        _state['error'] = None
+        _state['started_at'] = time.monotonic()
+    threading.Thread(target=_warm_up, name="model-warmup", daemon=True).start()
+
+def _warm_up():
+    try:
+        from utils.privacy import ensure_nltk_data
+        ensure_nltk_data()
+        
+        # Heavy imports happen here, off the script thread
+        from utils.embeddings import get_batch_embeddings, load_embedding_model
+        tokenizer, model = load_embedding_model()
+        get_batch_embeddings([WARMUP_TEXT], tokenizer, model)
+        
+        with _lock:
+            _state['model'] = (tokenizer, model)
+            _state['status'] = 'ready'
+            _state['ready_at'] = time.monotonic()
+    except Exception as e:
+        with _lock:
+            _state['status'] = 'failed'
+            _state['error'] = str(e)
+    finally:
+        _done.set()
+
+def warmup_status():
+    """Current status ('idle', 'loading', 'ready' or 'failed') with timing and any error"""
+    with _lock:
+        status = {'status': _state['status'], 'error': _state['error']}
+        if _state['ready_at'] is not None:
+            status['load_seconds'] = _state['ready_at'] - _state['started_at']
+        memory_report = getattr(_state['model'][1], 'memory_report', None) if _state['model'] else None
+        if memory_report:
+            status['memory'] = memory_report
+        return status
+
+def get_model(timeout=None):
+    """Return (tokenizer, model), waiting for the background load to finish"""
+    start_background_warmup()
+    if not _done.wait(timeout):
+        raise TimeoutError("The language model is still loading")
+    with _lock:
+        if _state['status'] == 'failed':
+            raise RuntimeError(f"The language model failed to load: {_state['error']}")
+        return _state['model']
+
+def render_status():
+    """Show model readiness in the Streamlit sidebar"""
+    import streamlit as st
+    
+    status = warmup_status()
+    if status['status'] == 'ready':
+        st.sidebar.success(f"✅ Language model ready ({status['load_seconds']:.1f}s to load)")
+        memory = status.get('memory')
+        if memory and memory['rss_before'] and memory['rss_after']:
+            st.sidebar.caption(f"Shared model weights: process memory {memory['rss_before'] / 2**20:.0f} MB "
+                               f"→ {memory['rss_after'] / 2**20:.0f} MB "
+                               f"({(memory['rss_file_after'] or 0) / 2**20:.0f} MB file-backed and shareable)")
+    elif status['status'] == 'failed':
+        st.sidebar.error(f"Language model failed to load: {status['error']}")
+    else:
+        st.sidebar.info("⏳ Language model is loading in the background. You can upload files meanwhile.")